@@ -1,21 +1,40 @@
+import json
+import sys
 import time
+from datetime import datetime
 from typing import Any, Callable
 
 
 class Attribute:
-    """Represents a single value on the PLC exposed via MQTT."""
+    """Represents a single value on the PLC exposed via MQTT.
+
+    Instances use ``__slots__``: with tens of thousands of tags a per-object
+    ``__dict__`` is the largest memory cost of the bridge.  The parsed
+    address is the same :class:`~.plc_client.ParsedAddress` stored by the
+    PLC client and the topic string is interned, so both are shared.
+    """
+
+    __slots__ = (
+        "plc_handler", "mqtt_handler", "name", "mqtt_device_topic", "full_mqtt_topic", "retain_messages",
+        "plc_address", "plc_set_address", "parsed_plc_address", "type", "publish_to_mqtt", "write_to_plc",
+        "is_internal", "boolean_inverted", "round_value", "write_back", "unit_of_measurement",
+        "publish_topic", "json_collector", "last_update", "last_value", "last_set_data", "update_interval",
+        "poll_interval", "deadband", "deadband_pct", "max_age", "threshold", "hysteresis",
+        "_threshold_state", "_subscribed_set", "publish_count", "filtered_count",
+    )
 
     def __init__(self, plc, mqtt, name: str, mqtt_device_topic: str, retain_messages: bool = False):
         self.plc_handler = plc
         self.mqtt_handler = mqtt
         self.name = name
         self.mqtt_device_topic = mqtt_device_topic
-        self.full_mqtt_topic = f"{mqtt_device_topic}/{name}"
+        self.full_mqtt_topic = sys.intern(f"{mqtt_device_topic}/{name}")
         self.retain_messages = bool(retain_messages)
 
         self.plc_address: str | None = None
         self.plc_set_address: str | None = None
         self.parsed_plc_address = None
+        self.type: str | None = None
         self.publish_to_mqtt = True
         self.write_to_plc = False
         self.is_internal = False
@@ -23,29 +42,49 @@ class Attribute:
         self.round_value = True
         self.write_back = False
         self.unit_of_measurement: str | None = None
+        # Pubblicazione: topic dell'attributo e/o JSON aggregato del device
+        self.publish_topic = True
+        self.json_collector: Callable[[str, Any], None] | None = None
 
         self.last_update = 0.0
         self.last_value: Any = None
+        self.last_set_data: Any = None
         self.update_interval = 0  # ms
+        self.poll_interval: int | None = None  # ms, None = update_time
+        # Filtri sui valori analogici: variazione minima assoluta e/o in % del
+        # valore pubblicato, ripubblicazione forzata dopo max_age ms
+        self.deadband = 0.0
+        self.deadband_pct = 0.0
+        self.max_age = 0  # ms
+        # Booleano ricavato da un analogico: soglia con isteresi (banda totale)
+        self.threshold: float | None = None
+        self.hysteresis = 0.0
+        self._threshold_state: bool | None = None
         self._subscribed_set = False
+        # Contatori per le metriche
+        self.publish_count = 0
+        self.filtered_count = 0
         self.set_RW("r")
 
         self.subscribe_plc_updates()
 
     def subscribe_plc_updates(self) -> None:
+        # Con update_interval o max_age il valore va ripubblicato anche se non cambia
+        track_changes = not (self.update_interval or self.max_age)
         if self.parsed_plc_address:
-            self.plc_handler.add_item(self.full_mqtt_topic, self.parsed_plc_address)
+            self.plc_handler.add_item(self.full_mqtt_topic, self.parsed_plc_address, self.poll_interval, track_changes)
         elif self.plc_address:
-            self.plc_handler.add_item(self.full_mqtt_topic, self.plc_address)
+            self.plc_handler.add_item(self.full_mqtt_topic, self.plc_address, self.poll_interval, track_changes)
+        if self.plc_set_address and self.plc_set_address != self.plc_address:
+            self.plc_handler.set_write_address(self.full_mqtt_topic, self.plc_set_address)
     def _update_set_subscription(self) -> None:
-        """Gestisce subscribe/unsubscribe a <topic>/set in base a write_to_plc."""
+        """Registra/rimuove l'handler di <topic>/set in base a write_to_plc."""
         topic_set = self.full_mqtt_topic + "/set"
         if self.write_to_plc and not self._subscribed_set:
-            self.mqtt_handler.subscribe(topic_set)
+            self.mqtt_handler.add_command_handler(topic_set, self.rec_mqtt_data)
             self._subscribed_set = True
         elif not self.write_to_plc and self._subscribed_set:
-            if hasattr(self.mqtt_handler, "unsubscribe"):
-                self.mqtt_handler.unsubscribe(topic_set)
+            self.mqtt_handler.remove_command_handler(topic_set)
             self._subscribed_set = False
 
     def set_RW(self, mode: str) -> None:
@@ -72,30 +111,71 @@ class Attribute:
             return
         if self.parsed_plc_address.dtype == "R" and self.round_value:
             try:
-                data = round(float(data), 3)
+                if isinstance(data, tuple):
+                    data = tuple(round(float(v), 3) for v in data)
+                else:
+                    data = round(float(data), 3)
             except Exception:
                 pass
-        if self.parsed_plc_address.dtype == "X" and self.boolean_inverted:
-            data = not bool(data)
+        if self.threshold is not None:
+            data = self._apply_threshold(data)
+        if (self.parsed_plc_address.dtype == "X" or self.threshold is not None) and self.boolean_inverted:
+            # Array di bit: inversione elemento per elemento
+            data = tuple(not v for v in data) if isinstance(data, tuple) else not bool(data)
         now = time.monotonic() * 1000
         should_update = False
         if self.update_interval:
             should_update = (now - self.last_update) > self.update_interval
         else:
-            should_update = data != self.last_value
-        if should_update:
+            should_update = self._changed(data) or (
+                bool(self.max_age) and (now - self.last_update) >= self.max_age
+            )
+        if not should_update:
+            self.filtered_count += 1
+        else:
+            self.publish_count += 1
             self.last_value = data
             self.last_update = now
-            self.mqtt_handler.publish(self.full_mqtt_topic, str(data), retain=self.retain_messages)
+            if self.publish_topic:
+                # Gli array sono pubblicati come un unico array JSON
+                payload = json.dumps(data) if isinstance(data, tuple) else str(data)
+                self.mqtt_handler.publish(self.full_mqtt_topic, payload, retain=self.retain_messages)
+            if self.json_collector is not None:
+                self.json_collector(self.name, data)
             if self.write_back:
-                if data == getattr(self, "last_set_data", None):
+                if data == self.last_set_data:
                     self.last_set_data = None
                 else:
                     self.write_to_plc_fn(data)
 
+    def _apply_threshold(self, value: Any) -> bool:
+        """On above ``threshold + hysteresis/2``, off below ``threshold - hysteresis/2``."""
+        half = self.hysteresis / 2
+        if value >= self.threshold + half:
+            self._threshold_state = True
+        elif value < self.threshold - half:
+            self._threshold_state = False
+        elif self._threshold_state is None:
+            self._threshold_state = value >= self.threshold
+        return self._threshold_state
+
+    def _changed(self, data: Any) -> bool:
+        last = self.last_value
+        if (
+            last is None
+            or not (self.deadband or self.deadband_pct)
+            or isinstance(data, bool)
+            or not isinstance(data, (int, float))
+        ):
+            return data != last
+        limit = max(self.deadband, abs(last) * self.deadband_pct / 100)
+        return abs(data - last) > limit
+
     # Incoming data from MQTT
     def rec_mqtt_data(self, data: str, cb: Callable[[Any], None] | None = None) -> None:
-        res = self.format_message(data, self.parsed_plc_address.dtype)
+        if self.parsed_plc_address is None:
+            return
+        res = self.format_message(data, self.parsed_plc_address.dtype, count=self.parsed_plc_address.count)
         if res[0] == 0:
             self.write_to_plc_fn(res[1])
             if cb:
@@ -106,11 +186,15 @@ class Attribute:
 
     def write_to_plc_fn(self, value: Any) -> None:
         self.last_set_data = value
-        self.plc_handler.write_item(self.full_mqtt_topic, value)
+        # Eseguita dal thread di I/O del PLC, non dal thread che riceve
+        self.plc_handler.submit_write(self.full_mqtt_topic, value)
 
-    def format_message(self, msg: str, plc_type: str, no_debug_out: bool = True):
+    def format_message(self, msg: str, plc_type: str, no_debug_out: bool = True, count: int = 0):
         """
         Converte una stringa 'msg' nel valore Python corretto in base al tipo PLC.
+        Con 'count' (array) 'msg' e' un array JSON di esattamente 'count'
+        elementi, restituito come tupla; per STRING/WSTRING 'count' e' la
+        lunghezza massima.
         Ritorna:
         [0, value]  -> ok
         [-2]        -> parsing/valore non valido
@@ -130,7 +214,32 @@ class Attribute:
         t = plc_type
         s = (msg or "").strip()
 
-        # Tipi supportati: X, B, W/I, D, R
+        if t == "STRING" or t == "WSTRING":
+            text = msg or ""
+            try:
+                size = len(text.encode("latin-1")) if t == "STRING" else len(text.encode("utf-16-be")) // 2
+            except UnicodeEncodeError:
+                return [-2]
+            if count and size > count:
+                return [-2]
+            return [0, text]
+
+        if count:
+            try:
+                values = json.loads(s)
+            except ValueError:
+                return [-2]
+            if not isinstance(values, list) or len(values) != count:
+                return [-2]
+            out = []
+            for v in values:
+                res = self.format_message(v if isinstance(v, str) else json.dumps(v), t)
+                if res[0] != 0:
+                    return res
+                out.append(res[1])
+            return [0, tuple(out)]
+
+        # Tipi supportati: X, B, W/I, D, R, DINT, LR, DTL
         if t == "X":
             b = _parse_bool(s)
             if b is None:
@@ -165,7 +274,24 @@ class Attribute:
                 return [-2]
             return [0, v]
 
-        if t == "R":
+        if t == "DINT":
+            try:
+                v = int(s, 0)
+            except ValueError:
+                return [-2]
+            if not (-0x80000000 <= v <= 0x7FFFFFFF):
+                return [-2]
+            return [0, v]
+
+        if t == "DTL":
+            # ISO 8601, es. 2024-05-01T12:30:00
+            try:
+                datetime.fromisoformat(s)
+            except ValueError:
+                return [-2]
+            return [0, s]
+
+        if t in {"R", "LR"}:
             # accetta virgola decimale
             s2 = s.replace(",", ".")
             try:
@@ -0,0 +1,183 @@
+"""Poll-cycle benchmark on the in-memory S7 simulator.
+
+Builds synthetic configurations of sensors spread over several DBs, runs
+poll cycles through :class:`~pys7tomqtt.plc_client.PlcClient` (read plan,
+decode, change detection and dispatch to the attributes) and reports cycle
+latency, tags/s, PLC round trips per cycle, allocations per cycle and the
+memory retained per configured tag::
+
+    python -m pys7tomqtt.benchmarks.poll_cycle --tags 10 1000 50000
+"""
+
+import argparse
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Dict, List
+
+from ..device_factory import device_factory
+from ..mqtt_client import MqttClient
+from ..plc_client import PlcClient
+from ..simulator import S7Simulator
+from ..utils import parse_address
+
+# Tipi e dimensioni usati per i tag sintetici
+_TYPES = [("X", 1), ("B", 1), ("W", 2), ("D", 4), ("R", 4)]
+
+
+class _CountingMqtt(MqttClient):
+    """MQTT stub that only counts publishes, so memory stays flat."""
+
+    def __init__(self):
+        super().__init__({}, client=None)
+        self.count = 0
+
+    def publish(self, topic: str, payload: str, retain: bool = False) -> None:
+        self.count += 1
+
+
+def synthetic_configs(tags: int, tags_per_db: int = 500) -> List[dict]:
+    configs = []
+    db, offset, bit = 1, 0, 0
+    for i in range(tags):
+        if i and i % tags_per_db == 0:
+            db, offset, bit = db + 1, 0, 0
+        dtype, size = _TYPES[i % len(_TYPES)]
+        if dtype == "X":
+            address = f"DB{db}.DBX{offset}.{bit}"
+            bit += 1
+            if bit == 8:
+                offset, bit = offset + 1, 0
+            configs.append({"type": "sensor", "name": f"t{i}", "state": address})
+            continue
+        if bit:
+            offset, bit = offset + 1, 0
+        if size > 1 and offset & 1:
+            offset += 1  # word e dword allineati come in un DB S7
+        configs.append({"type": "sensor", "name": f"t{i}", "state": f"DB{db}.DB{dtype}{offset}"})
+        offset += size
+    return configs
+
+
+def _build(plc: PlcClient, mqtt: MqttClient, configs: List[dict]) -> Dict[str, object]:
+    devices: Dict[str, object] = {}
+    for cfg in configs:
+        dev = device_factory(devices, plc, mqtt, cfg, "bench", False, "ha", False)
+        devices[dev.mqtt_name] = dev
+    return devices
+
+
+def measure_memory(tags: int) -> float:
+    """Bytes retained per tag by devices, attributes, read plan and codecs."""
+
+    configs = synthetic_configs(tags)
+    sim = S7Simulator(default_db_size=65536)
+    for db in {parse_address(cfg["state"])[0] for cfg in configs}:
+        sim.add_db(db, 65536)  # i DB del simulatore non vanno contati
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    plc = PlcClient({}, client=sim)
+    devices = _build(plc, _CountingMqtt(), configs)
+    plc.read_group(None)  # piano e codec compilati
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del devices
+    return retained / tags
+
+
+def run_benchmark(tags: int, cycles: int = 20, latency: float = 0.0, pdu: int = 480, change_rate: float = 0.01, seed: int = 1) -> Dict[str, float]:
+    rng = random.Random(seed)
+    sim = S7Simulator(latency=latency, pdu=pdu, default_db_size=65536)
+    plc = PlcClient({}, client=sim)
+    mqtt = _CountingMqtt()
+
+    configs = synthetic_configs(tags)
+    targets = []
+    for cfg in configs:
+        db, _, byte, *_ = parse_address(cfg["state"])
+        targets.append((db, byte))
+
+    started = time.perf_counter()
+    _build(plc, mqtt, configs)
+    setup = time.perf_counter() - started
+
+    def cycle() -> None:
+        plc.dispatch(plc.read_group(None, changes_only=True))
+
+    def mutate() -> None:
+        for _ in range(int(tags * change_rate)):
+            db, byte = rng.choice(targets)
+            sim.dbs[db][byte] ^= 0xFF
+
+    cycle()  # primo ciclo: piano, codec e decodifica completa
+    sim.reset_counters()
+    mqtt.count = 0
+
+    durations = []
+    for _ in range(cycles):
+        mutate()
+        t0 = time.perf_counter()
+        cycle()
+        durations.append(time.perf_counter() - t0)
+    requests = sim.requests
+    published = mqtt.count
+
+    tracemalloc.start()
+    alloc = []
+    for _ in range(min(cycles, 5)):
+        mutate()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        cycle()
+        alloc.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    mean = statistics.fmean(durations)
+    return {
+        "tags": tags,
+        "setup_s": setup,
+        "cycle_ms": mean * 1000,
+        "p95_ms": sorted(durations)[int(0.95 * (len(durations) - 1))] * 1000,
+        "tags_per_s": tags / mean if mean else float("inf"),
+        "round_trips": requests / cycles,
+        "published": published / cycles,
+        "alloc_kb": statistics.fmean(alloc) / 1024,
+        "bytes_per_tag": measure_memory(tags),
+    }
+
+
+# (colonna, larghezza, formato)
+_COLUMNS = [
+    ("tags", 8, "d"),
+    ("setup_s", 9, ".3f"),
+    ("cycle_ms", 10, ".3f"),
+    ("p95_ms", 9, ".3f"),
+    ("tags_per_s", 12, ".0f"),
+    ("round_trips", 12, ".1f"),
+    ("published", 10, ".1f"),
+    ("alloc_kb", 9, ".1f"),
+    ("bytes_per_tag", 14, ".0f"),
+]
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latenza simulata per richiesta")
+    parser.add_argument("--pdu", type=int, default=480)
+    parser.add_argument("--change-rate", type=float, default=0.01, help="frazione di tag modificati per ciclo")
+    args = parser.parse_args(argv)
+
+    print("".join(f"{name:>{width}}" for name, width, _ in _COLUMNS))
+    for tags in args.tags:
+        row = run_benchmark(tags, args.cycles, args.latency_ms / 1000, args.pdu, args.change_rate)
+        print("".join(f"{row[name]:>{width}{fmt}}" for name, width, fmt in _COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
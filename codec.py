@@ -0,0 +1,213 @@
+import struct
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Tuple, TYPE_CHECKING
+
+from .read_plan import item_size
+from .utils import STRING_TYPES
+
+if TYPE_CHECKING:  # pragma: no cover - imported for annotations only
+    from .plc_client import ParsedAddress
+    from .read_plan import ReadBlock
+
+# Formato struct (big endian) di ogni tipo PLC; X legge il byte intero
+TYPE_FORMATS = {
+    "X": "B",
+    "B": "B",
+    "W": "h",  # word 16-bit (signed, come l'int16)
+    "I": "h",
+    "D": "I",
+    "R": "f",
+    "DINT": "i",
+    "LR": "d",
+}
+
+# DTL: anno, mese, giorno, giorno della settimana (1 = domenica), ore,
+# minuti, secondi, nanosecondi
+_DTL = struct.Struct(">HBBBBBBI")
+
+Decoder = Callable[[bytes, int], Any]
+
+
+def is_scalar(item: "ParsedAddress") -> bool:
+    """True for items decoded by a plain struct field (no array, string or DTL)."""
+
+    return not item.count and item.dtype in TYPE_FORMATS
+
+
+def _decode_dtl(buf: bytes, offset: int) -> str:
+    # Formattata a mano: un DB azzerato (anno 0, mese 0) non e' una data valida
+    year, month, day, _, hour, minute, second, ns = _DTL.unpack_from(buf, offset)
+    return f"{year:04d}-{month:02d}-{day:02d}T{hour:02d}:{minute:02d}:{second:02d}.{ns // 1000:06d}"
+
+
+def _decoder(item: "ParsedAddress") -> Decoder:
+    """Decoder of an array, STRING, WSTRING or DTL item."""
+
+    dtype, count = item.dtype, item.count
+    if dtype == "STRING":
+        def decode(buf, offset):
+            size = min(buf[offset + 1], count)
+            return bytes(buf[offset + 2:offset + 2 + size]).decode("latin-1")
+        return decode
+    if dtype == "WSTRING":
+        def decode(buf, offset):
+            size = min(int.from_bytes(buf[offset + 2:offset + 4], "big"), count)
+            return bytes(buf[offset + 4:offset + 4 + 2 * size]).decode("utf-16-be", "replace")
+        return decode
+    if dtype == "DTL":
+        if not count:
+            return _decode_dtl
+        return lambda buf, offset: tuple(_decode_dtl(buf, offset + 12 * i) for i in range(count))
+    if dtype == "X":
+        first, size = item.bit, item_size(item)
+
+        def decode(buf, offset):
+            bits = int.from_bytes(buf[offset:offset + size], "little")
+            return tuple(bool(bits >> (first + i) & 1) for i in range(count))
+        return decode
+    array = struct.Struct(f">{count}{TYPE_FORMATS[dtype]}")
+    return array.unpack_from
+
+
+def _scalar_decoder(code: str) -> Decoder:
+    s = struct.Struct(">" + code)
+    return lambda buf, offset: s.unpack_from(buf, offset)[0]
+
+
+def _encode_scalar(dtype: str, value: Any, length: int = 0) -> bytes:
+    if dtype == "B":
+        return int(value).to_bytes(1, byteorder="big", signed=False)
+    if dtype in {"W", "I"}:
+        # INT16 signed
+        return int(value).to_bytes(2, byteorder="big", signed=True)
+    if dtype == "D":
+        # DWORD unsigned 32 or float when value is float
+        if isinstance(value, float):
+            return struct.pack(">f", float(value))
+        return int(value).to_bytes(4, byteorder="big", signed=False)
+    if dtype == "R":
+        # REAL float32
+        return struct.pack(">f", float(value))
+    if dtype == "DINT":
+        return int(value).to_bytes(4, byteorder="big", signed=True)
+    if dtype == "LR":
+        return struct.pack(">d", float(value))
+    if dtype == "STRING":
+        # Header con la lunghezza massima configurata: deve coincidere con il PLC
+        data = str(value).encode("latin-1", "replace")[:length]
+        return bytes((length, len(data))) + data
+    if dtype == "WSTRING":
+        data = str(value).encode("utf-16-be")[:2 * length]
+        return struct.pack(">HH", length, len(data) // 2) + data
+    if dtype == "DTL":
+        dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+        weekday = dt.isoweekday() % 7 + 1
+        return _DTL.pack(dt.year, dt.month, dt.day, weekday, dt.hour, dt.minute, dt.second, dt.microsecond * 1000)
+    raise ValueError(f"Tipo non supportato: {dtype}")
+
+
+def encode_value(item: "ParsedAddress", value: Any) -> bytes:
+    """Bytes written to the PLC for ``value`` at ``item``.
+
+    Arrays take a sequence with exactly ``item.count`` elements.  Bit
+    arrays are written bit by bit by the client and are not handled here.
+    """
+
+    if item.count and item.dtype not in STRING_TYPES:
+        values = list(value)
+        if len(values) != item.count:
+            raise ValueError(f"{item.count} valori attesi, ricevuti {len(values)}")
+        return b"".join(_encode_scalar(item.dtype, v) for v in values)
+    return _encode_scalar(item.dtype, value, item.count)
+
+
+class BlockCodec:
+    """Decoder compiled once for a :class:`ReadBlock`.
+
+    The distinct fields of the block (offset and format) are laid out in a
+    single ``struct.Struct`` so one ``unpack_from`` call decodes the whole
+    buffer.  Bits share the field of their byte and are extracted with a
+    precomputed mask.  Fields overlapping others (e.g. ``DBB0`` and ``DBW0``)
+    get their own precompiled struct.  Arrays, strings and DTL timestamps
+    are decoded as a whole by their own decoder into one field (a tuple for
+    arrays), so change detection compares the entire value.
+    """
+
+    __slots__ = ("struct", "extras", "bindings", "by_field", "always")
+
+    def __init__(self, block: "ReadBlock", always: Iterable[str] = ()):
+        always = set(always)
+        fields: Dict[Tuple[int, str], int] = {}
+        keys: List[Tuple[int, str]] = []
+        decoders: Dict[Tuple[int, str], Decoder] = {}
+        for _, item in block.items:
+            key = self._key(item, block.start)
+            if key not in fields:
+                fields[key] = -1
+                keys.append(key)
+                if not is_scalar(item):
+                    decoders[key] = _decoder(item)
+
+        # Campi senza sovrapposizioni nello struct principale, gli altri a parte
+        fmt = [">"]
+        cursor = 0
+        main: List[Tuple[int, str]] = []
+        extra: List[Tuple[int, str]] = []
+        for offset, code in sorted(keys):
+            if offset < cursor or (offset, code) in decoders:
+                extra.append((offset, code))
+                continue
+            if offset > cursor:
+                fmt.append(f"{offset - cursor}x")
+            fmt.append(code)
+            cursor = offset + struct.calcsize(">" + code)
+            main.append((offset, code))
+        self.struct = struct.Struct("".join(fmt))
+        self.extras = [(decoders.get(key) or _scalar_decoder(key[1]), key[0]) for key in extra]
+        for index, key in enumerate(main + extra):
+            fields[key] = index
+
+        self.bindings: List[Tuple[int, int, str]] = []
+        self.by_field: List[List[Tuple[str, int]]] = [[] for _ in fields]
+        self.always: List[Tuple[int, int, str]] = []
+        for topic, item in block.items:
+            index = fields[self._key(item, block.start)]
+            mask = 1 << item.bit if item.dtype == "X" and not item.count else 0
+            self.bindings.append((index, mask, topic))
+            self.by_field[index].append((topic, mask))
+            if topic in always:
+                self.always.append((index, mask, topic))
+
+    @staticmethod
+    def _key(item: "ParsedAddress", start: int) -> Tuple[int, str]:
+        if is_scalar(item):
+            return (item.byte - start, TYPE_FORMATS[item.dtype])
+        return (item.byte - start, f"{item.dtype}{item.bit}[{item.count}]")
+
+    def unpack(self, buf: bytes) -> tuple:
+        values = self.struct.unpack_from(buf, 0)
+        if self.extras:
+            values += tuple(decode(buf, offset) for decode, offset in self.extras)
+        return values
+
+    def decode(self, fields: tuple, out: Dict[str, Any]) -> None:
+        """Store the value of every item of the block in ``out``."""
+
+        for index, mask, topic in self.bindings:
+            value = fields[index]
+            out[topic] = bool(value & mask) if mask else value
+
+    def decode_changes(self, old: tuple, new: tuple, out: Dict[str, Any]) -> None:
+        """Store in ``out`` only the items whose field (or bit) changed."""
+
+        for index, (a, b) in enumerate(zip(old, new)):
+            if a == b:
+                continue
+            for topic, mask in self.by_field[index]:
+                if not mask:
+                    out[topic] = b
+                elif (a ^ b) & mask:
+                    out[topic] = bool(b & mask)
+        for index, mask, topic in self.always:
+            value = new[index]
+            out[topic] = bool(value & mask) if mask else value
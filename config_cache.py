@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import marshal
+import os
+from typing import Any, Dict, Tuple
+
+from .utils import parse_address, preload_addresses
+
+# Da incrementare quando cambia il formato della cache o del parser
+CACHE_VERSION = 3
+
+TagTable = Dict[str, Tuple[int, str, int, int, int, int]]
+
+
+def iter_addresses(cfg: Dict[str, Any]):
+    """Yield ``(device, address, required)`` for the addresses of the devices.
+
+    Attribute dictionaries give ``plc``/``set_plc`` (``required``: they must
+    be valid addresses); plain string values are candidate addresses, since
+    device types accept ``state: DB1.DBX0.0`` as a shorthand.
+    """
+
+    for dev_cfg in cfg.get("devices") or []:
+        if not isinstance(dev_cfg, dict):
+            continue
+        name = dev_cfg.get("name", "unnamed device")
+        for value in dev_cfg.values():
+            if isinstance(value, dict):
+                for key in ("plc", "set_plc"):
+                    if isinstance(value.get(key), str):
+                        yield name, value[key], True
+            elif isinstance(value, str):
+                yield name, value, False
+
+
+def compile_tag_table(cfg: Dict[str, Any]) -> TagTable:
+    """Parse every address of the config once and return the validated table.
+
+    Invalid ``plc``/``set_plc`` addresses are logged (the attribute is then
+    skipped, as before).  The parsed addresses stay memoized in
+    :func:`~.utils.parse_address`.
+    """
+
+    table: TagTable = {}
+    for device, address, required in iter_addresses(cfg):
+        if address in table:
+            continue
+        try:
+            table[address] = parse_address(address)
+        except ValueError:
+            if required:
+                logging.warning("Device %s: invalid PLC address %s", device, address)
+    return table
+
+
+def config_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def load_cache(path: str, raw: bytes) -> Dict[str, Any] | None:
+    """Config stored in ``path`` for the file content ``raw``, else ``None``.
+
+    The cache holds the loaded YAML and the tag table; a hit also seeds the
+    address memo, so neither the YAML nor the addresses are parsed again.
+    """
+
+    try:
+        with open(path, "rb") as f:
+            # loads su bytes: marshal.load su file legge a piccoli blocchi
+            data = marshal.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, TypeError) as exc:
+        logging.warning("Ignoring unreadable config cache %s: %s", path, exc)
+        return None
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION or data.get("hash") != config_hash(raw):
+        return None
+    preload_addresses(data["addresses"])
+    return data["config"]
+
+
+def store_cache(path: str, raw: bytes, cfg: Dict[str, Any], table: TagTable) -> None:
+    """Write the cache atomically; failures are logged and otherwise ignored."""
+
+    data = {"version": CACHE_VERSION, "hash": config_hash(raw), "config": cfg, "addresses": table}
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(marshal.dumps(data))
+        os.replace(tmp, path)
+    except (OSError, ValueError) as exc:  # ValueError: valori non serializzabili
+        logging.warning("Failed to write config cache %s: %s", path, exc)
@@ -1,18 +1,27 @@
 import json
-from typing import Dict, Any
+import sys
+from typing import Dict, Any, Tuple
 
 from .attribute import Attribute
-from .utils import Utils
+from .utils import parse_address
 from .plc_client import ParsedAddress
 
+# Tipi su cui deadband e threshold hanno senso
+NUMERIC_TYPES = frozenset(("X", "B", "W", "I", "D", "R", "DINT", "LR"))
+
 class Device:
     """Base class for devices containing multiple attributes."""
 
+    __slots__ = (
+        "plc_handler", "mqtt_handler", "name", "type", "discovery_topic", "discovery_retain", "retain_messages",
+        "mqtt_name", "full_mqtt_topic", "poll_interval", "publish_mode", "_json_state", "_json_dirty", "attributes",
+    )
+
     def __init__(self, plc, mqtt, config: dict):
         self.plc_handler = plc
         self.mqtt_handler = mqtt
         self.name = config.get("name", "unnamed device")
-        self.type = config["type"].lower()
+        self.type = sys.intern(config["type"].lower())
         self.discovery_topic = config.get("discovery_topic", "testha")
         self.discovery_retain = config.get("discovery_retain", False)
         self.retain_messages = config.get("retain_messages", False)
@@ -21,46 +30,85 @@ class Device:
         base = config.get("mqtt_base", "s7")
         self.full_mqtt_topic = f"{base}/{self.mqtt_name}"
 
+        # Intervallo di lettura (ms) di default per gli attributi del device
+        self.poll_interval = config.get("poll_interval")
+
+        # "attributes": un messaggio per attributo, "json": un solo documento
+        # JSON per ciclo su <device>/attributes, "both": entrambi
+        self.publish_mode = sys.intern(str(config.get("publish_mode", "attributes")).lower())
+        if self.publish_mode not in {"attributes", "json", "both"}:
+            raise ValueError(f"publish_mode non valido: {self.publish_mode}")
+        self._json_state: Dict[str, Any] | None = {} if self.publish_mode != "attributes" else None
+        self._json_dirty = False
+
         self.attributes: Dict[str, Attribute] = {}
 
     def create_attribute(self, config: Any, name: str) -> None:
         attr = Attribute(self.plc_handler, self.mqtt_handler, name, self.full_mqtt_topic, self.retain_messages)
+        attr.poll_interval = self.poll_interval
+        attr.publish_topic = self.publish_mode != "json"
+        if self.publish_mode != "attributes":
+            attr.json_collector = self._collect_json
 
+        rw = None
         if isinstance(config, dict):
             attr.plc_address = config.get("plc")
             attr.plc_set_address = config.get("set_plc")
-            if config.get("rw"):
-                attr.set_RW(config["rw"])
+            rw = config.get("rw")
             if config.get("update_interval"):
                 attr.update_interval = config["update_interval"]
+            if config.get("poll_interval"):
+                attr.poll_interval = config["poll_interval"]
             if config.get("inverted"):
                 attr.boolean_inverted = config["inverted"]
             if config.get("unit_of_measurement"):
                 attr.unit_of_measurement = config["unit_of_measurement"]
             if config.get("write_back"):
                 attr.write_back = config["write_back"]
+            if config.get("deadband"):
+                attr.deadband = float(config["deadband"])
+            if config.get("deadband_pct"):
+                attr.deadband_pct = float(config["deadband_pct"])
+            if config.get("max_age"):
+                attr.max_age = config["max_age"]
+            if config.get("threshold") is not None:
+                attr.threshold = float(config["threshold"])
+                attr.hysteresis = float(config.get("hysteresis", 0))
         else:
             attr.plc_address = config
 
         if attr.plc_address:
             try:
-                db, dtype, byte, bit = Utils()._parse_address(attr.plc_address)
+                parsed = parse_address(attr.plc_address)
             except ValueError:
                 return
+            dtype, bit = parsed[1], parsed[3]
             if dtype != "X" and bit != 0:
                 raise ValueError(f"Bit offset non ammesso per {dtype}: bit={bit}")
             if dtype == "X" and not (0 <= bit <= 7):
                 raise ValueError(f"Bit offset fuori range (0-7): {bit}")
             attr.type = dtype
-            attr.parsed_plc_address = ParsedAddress(attr.plc_address, db, dtype, byte, bit)
+            attr.parsed_plc_address = ParsedAddress(attr.plc_address, *parsed)
+            if (dtype not in NUMERIC_TYPES or parsed[4]) and (
+                attr.deadband or attr.deadband_pct or attr.threshold is not None
+            ):
+                raise ValueError(f"deadband/threshold ammessi solo su scalari numerici: {attr.plc_address}")
             attr.subscribe_plc_updates()
         else:
             attr.subscribe_plc_updates()
 
+        # Handler di <topic>/set registrato solo per attributi validi
+        if rw:
+            attr.set_RW(rw)
         self.attributes[name] = attr
 
 
     def send_discover_msg(self, info: Dict[str, Any] | None = None) -> None:
+        topic, payload = self.discovery_message(info)
+        self.mqtt_handler.publish(topic, payload, retain=self.discovery_retain)
+
+    def discovery_message(self, info: Dict[str, Any] | None = None) -> Tuple[str, str]:
+        """Topic and JSON payload of the Home Assistant discovery config."""
         info = info or {}
         topic = f"{self.discovery_topic}/{self.type}/s7-connector/{self.mqtt_name}/config"
         info["uniq_id"] = f"s7-{self.mqtt_name}"
@@ -82,6 +130,9 @@ class Device:
                     info["payload_off"] = "False"
                 if attr.publish_to_mqtt:
                     info["state_topic"] = f"{self.full_mqtt_topic}/state"
+                    if self.publish_mode == "json":
+                        info["state_topic"] = f"{self.full_mqtt_topic}/attributes"
+                        info["value_template"] = "{{ value_json.state }}"
                     info["state_on"] = "True"
                     info["state_off"] = "False"
                 attr_info[attr_name] = {
@@ -91,7 +142,26 @@ class Device:
                 }
             info["attributes_info"] = attr_info
 
-        self.mqtt_handler.publish(topic, json.dumps(info), retain=self.discovery_retain)
+        return topic, json.dumps(info)
+
+    def _collect_json(self, attr: str, value: Any) -> None:
+        self._json_state[attr] = value
+        if not self._json_dirty:
+            # Pubblicato una sola volta a fine ciclo di dispatch
+            self._json_dirty = True
+            self.plc_handler.defer(self.flush_json)
+
+    def flush_json(self) -> None:
+        """Publish the values of all attributes as one JSON document."""
+        if not self._json_dirty:
+            return
+        self._json_dirty = False
+        self.mqtt_handler.publish(f"{self.full_mqtt_topic}/attributes", json.dumps(self._json_state), retain=self.retain_messages)
+
+    def publish_availability(self, online: bool) -> None:
+        """Publish the PLC connection state on the availability topic."""
+        payload = "online" if online else "offline"
+        self.mqtt_handler.publish(f"{self.full_mqtt_topic}/availability", payload, retain=True)
 
     def rec_s7_data(self, attr: str, data: Any) -> None:
         if attr in self.attributes:
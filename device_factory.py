@@ -4,7 +4,7 @@ from .device import Device
 from .devices import LightDevice, SensorDevice
 
 
-def device_factory(devices: Dict[str, Device], plc, mqtt, config: dict, mqtt_base: str, retain_messages: bool, discovery_topic: bool, discovery_retain: bool) -> Device:
+def device_factory(devices: Dict[str, Device], plc, mqtt, config: dict, mqtt_base: str, retain_messages: bool, discovery_topic: bool, discovery_retain: bool, publish_mode: str = "attributes") -> Device:
     """Create a new device instance based on the configuration.
 
     The implementation mirrors the behaviour of the original Node.js
@@ -28,6 +28,7 @@ def device_factory(devices: Dict[str, Device], plc, mqtt, config: dict, mqtt_bas
     config["retain_messages"] = retain_messages
     config["discovery_topic"] = discovery_topic
     config["discovery_retain"] = discovery_retain
+    config.setdefault("publish_mode", publish_mode)
 
     if type_lower == "light":
         device = LightDevice(plc, mqtt, config)
@@ -37,4 +38,9 @@ def device_factory(devices: Dict[str, Device], plc, mqtt, config: dict, mqtt_bas
         device = SensorDevice(plc, mqtt, config)
     else:
         device = Device(plc, mqtt, config)
+
+    # Le letture vanno direttamente all'attributo, senza parsing del topic
+    for attr in device.attributes.values():
+        if attr.parsed_plc_address is not None:
+            plc.bind(attr.full_mqtt_topic, attr.rec_s7_data)
     return device
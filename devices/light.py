@@ -4,6 +4,8 @@ from ..device import Device
 class LightDevice(Device):
     """Simple light device exposing a binary state and optional brightness."""
 
+    __slots__ = ()
+
     def __init__(self, plc, mqtt, config):
         super().__init__(plc, mqtt, config)
         if "state" in config:
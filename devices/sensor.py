@@ -3,6 +3,8 @@ from ..device import Device
 class SensorDevice(Device):
     """Simple sensor device exposing a state."""
 
+    __slots__ = ()
+
     def __init__(self, plc, mqtt, config):
         super().__init__(plc, mqtt, config)
         if "state" in config:
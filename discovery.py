@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Dict, Iterable
+
+
+def _digest(payload: str) -> str:
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class DiscoveryPublisher:
+    """Home Assistant discovery publishing, incremental and paced.
+
+    With retained discovery messages, the hash of each payload is compared
+    with the last one known for its topic: from ``state_file`` (written after
+    every run) or, with :meth:`observe_retained`, from the messages retained
+    on the broker.  Unchanged configs are skipped; the others are published
+    by :meth:`run` at most ``rate`` messages per second.  Without retain
+    every config is sent, since Home Assistant keeps nothing across restarts.
+
+    A hash is recorded only when the MQTT client confirms the message was
+    sent; :meth:`run` waits up to ``confirm_timeout`` seconds for the
+    confirmations before writing the state file, so a config lost in the
+    outbound queue is published again on the next start.
+    """
+
+    def __init__(
+        self,
+        mqtt,
+        retain: bool = False,
+        state_file: str | None = None,
+        rate: float = 50.0,
+        confirm_timeout: float = 30.0,
+    ):
+        self._mqtt = mqtt
+        self.retain = bool(retain)
+        self.state_file = state_file
+        self.rate = float(rate)
+        self._known: Dict[str, str] = self._load_state() if self.retain else {}
+        self._pending: "OrderedDict[str, str]" = OrderedDict()
+        self.confirm_timeout = float(confirm_timeout)
+        # Conferme attese: arrivano dal thread di rete MQTT
+        self._unconfirmed = 0
+        self._confirm_lock = threading.Lock()
+        self.sent = 0
+        self.skipped = 0
+
+    def _load_state(self) -> Dict[str, str]:
+        if not self.state_file:
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            logging.warning("Ignoring discovery state file %s: %s", self.state_file, exc)
+            return {}
+        return {str(k): str(v) for k, v in state.items()} if isinstance(state, dict) else {}
+
+    def _save_state(self) -> None:
+        if not (self.state_file and self.retain):
+            return
+        tmp = f"{self.state_file}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._known, f, sort_keys=True)
+            os.replace(tmp, self.state_file)
+        except OSError as exc:
+            logging.warning("Failed to write discovery state file %s: %s", self.state_file, exc)
+
+    def use_broker_state(self) -> None:
+        """Forget the local state: only configs seen by :meth:`observe_retained` count."""
+
+        self._known = {}
+
+    def observe_retained(self, topic: str, payload: str) -> None:
+        """Record a discovery config retained on the broker (MQTT thread)."""
+
+        if payload:
+            self._known[topic] = _digest(payload)
+        else:
+            self._known.pop(topic, None)
+
+    def queue(self, topic: str, payload: str) -> None:
+        if self.retain and self._known.get(topic) == _digest(payload):
+            self.skipped += 1
+            return
+        self._pending[topic] = payload
+
+    def queue_devices(self, devices: Iterable) -> None:
+        for dev in devices:
+            self.queue(*dev.discovery_message())
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def unconfirmed(self) -> int:
+        return self._unconfirmed
+
+    def _confirmed(self, topic: str, digest: str) -> None:
+        with self._confirm_lock:
+            self._known[topic] = digest
+            self._unconfirmed -= 1
+
+    async def run(self) -> None:
+        """Publish the queued configs, pacing them to ``rate`` per second."""
+
+        interval = 1 / self.rate if self.rate > 0 else 0
+        if self._pending or self.skipped:
+            logging.info("Discovery: %d config(s) to publish, %d unchanged", len(self._pending), self.skipped)
+        while self._pending:
+            topic, payload = self._pending.popitem(last=False)
+            with self._confirm_lock:
+                self._unconfirmed += 1
+            on_sent = partial(self._confirmed, topic, _digest(payload))
+            self._mqtt.publish(topic, payload, retain=self.retain, on_sent=on_sent)
+            self.sent += 1
+            if interval and self._pending:
+                await asyncio.sleep(interval)
+        deadline = time.monotonic() + self.confirm_timeout
+        while self._unconfirmed and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._unconfirmed:
+            logging.warning("Discovery: %d config(s) not confirmed, they will be sent again", self._unconfirmed)
+        with self._confirm_lock:
+            self._save_state()
@@ -1,58 +1,173 @@
+import argparse
 import asyncio
+import logging
+import signal
 import yaml
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Dict
 
+from .config_cache import compile_tag_table, load_cache, store_cache
 from .mqtt_client import MqttClient
 from .plc_client import PlcClient
 from .device_factory import device_factory
+from .discovery import DiscoveryPublisher
+from .metrics import MetricsRegistry, register_pipeline
+from .scheduler import PollScheduler
+from .tracing import ProfileCapture
 
-def load_config(path: str) -> Dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+def load_config(path: str, cache_path: str | None = None) -> Dict:
+    """Load the YAML config and compile its tag table.
 
+    With ``cache_path`` the loaded config and the parsed addresses are
+    stored there, keyed by the hash of the file: restarts with an unchanged
+    config skip both the YAML and the address parsing.
+    """
 
-def mqtt_message_factory(devices):
-    def mqtt_message(topic: str, payload: str) -> None:
-        parts = topic.split('/')
-        if len(parts) < 3:
-            return
-        device = devices.get(parts[1])
-        if device:
-            device.rec_mqtt_data(parts[2], payload)
-    return mqtt_message
+    with open(path, "rb") as f:
+        raw = f.read()
+    if cache_path:
+        cfg = load_cache(cache_path, raw)
+        if cfg is not None:
+            logging.info("Config loaded from cache %s", cache_path)
+            return cfg
+    # Loader C di libyaml quando disponibile
+    cfg = yaml.load(raw, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+    table = compile_tag_table(cfg)
+    if cache_path:
+        store_cache(cache_path, raw, cfg, table)
+    return cfg
 
 
-async def main(config_path: str = "config.yaml") -> None:
-    cfg = load_config(config_path)
+def plc_configs(cfg: Dict) -> Dict[str, Dict]:
+    """Named PLC configurations.
+
+    ``plcs`` is a list of PLC sections, each with a unique ``name``; the
+    single ``plc`` section of older configs becomes the PLC ``default``.
+    """
+
+    if not cfg.get("plcs"):
+        return {"default": cfg.get("plc", {})}
+    result: Dict[str, Dict] = {}
+    for index, plc_cfg in enumerate(cfg["plcs"], start=1):
+        name = str(plc_cfg.get("name", f"plc{index}"))
+        if name in result:
+            raise ValueError(f"Nome PLC duplicato: {name}")
+        result[name] = plc_cfg
+    return result
+
+
+def _start_profile(capture: ProfileCapture, payload: str) -> None:
+    try:
+        cycles = int(payload) if payload.strip() else None
+    except ValueError:
+        logging.warning("Invalid profile request %r, expected a number of cycles", payload)
+        return
+    capture.start(cycles)
+
+
+def publish_availability(devices: list, online: bool) -> None:
+    for dev in devices:
+        dev.publish_availability(online)
+
+
+async def main(config_path: str = "config.yaml", cache_path: str | None = None) -> None:
+    cfg = load_config(config_path, cache_path)
 
     devices: Dict[str, object] = {}
 
-    mqtt = MqttClient(cfg.get("mqtt", {}), message_callback=mqtt_message_factory(devices))
-    plc = PlcClient(cfg.get("plc", {}))
+    mqtt = MqttClient(cfg.get("mqtt", {}))
     ha = cfg.get("ha", {})
 
+    # Ogni PLC ha il proprio thread di I/O: un controllore lento o non
+    # raggiungibile non blocca i cicli degli altri
+    loop = asyncio.get_running_loop()
+    plc_cfgs = plc_configs(cfg)
+    executors = {
+        name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"plc-io-{name}") for name in plc_cfgs
+    }
+    clients = await asyncio.gather(
+        *(loop.run_in_executor(executors[name], PlcClient, plc_cfg) for name, plc_cfg in plc_cfgs.items())
+    )
+    plcs = dict(zip(plc_cfgs, clients))
+    for name, plc in plcs.items():
+        plc.set_io_executor(executors[name], loop)
+    default_plc = next(iter(plcs))
+
+    plc_devices: Dict[str, list] = {name: [] for name in plcs}
     for dev_cfg in cfg.get("devices", []):
-        dev = device_factory(devices, plc, mqtt, dev_cfg, cfg.get("mqtt_base", "s7"), cfg.get("retain_messages", False), ha.get("discovery_topic", "hatest"), ha.get("discovery_retain", False))
+        plc_name = str(dev_cfg.get("plc", default_plc))
+        if plc_name not in plcs:
+            raise ValueError(f"PLC sconosciuto '{plc_name}' per il device {dev_cfg.get('name')}")
+        dev = device_factory(devices, plcs[plc_name], mqtt, dev_cfg, cfg.get("mqtt_base", "s7"), cfg.get("retain_messages", False), ha.get("discovery_topic", "hatest"), ha.get("discovery_retain", False), cfg.get("publish_mode", "attributes"))
         devices[dev.mqtt_name] = dev
-        if ha.get("discovery", False):
-            dev.send_discover_msg()
+        plc_devices[plc_name].append(dev)
+
+    # Discovery incrementale: solo i config cambiati, a ritmo limitato
+    discovery = None
+    if ha.get("discovery", False):
+        discovery = DiscoveryPublisher(mqtt, ha.get("discovery_retain", False), ha.get("discovery_state_file"), ha.get("discovery_rate", 50))
+        check = float(ha.get("discovery_check_retained", 0) or 0)
+        if check and discovery.retain:
+            # I config retained arrivano subito dopo la subscribe
+            retained = f"{ha.get('discovery_topic', 'hatest')}/+/s7-connector/+/config"
+            discovery.use_broker_state()
+            mqtt.add_topic_handler(retained, discovery.observe_retained)
+            await asyncio.sleep(check)
+            mqtt.remove_topic_handler(retained)
+        discovery.queue_devices(devices.values())
 
-    update_time = cfg.get("update_time", 1)
+    # Topic availability dei device aggiornato con lo stato della connessione
+    for name, plc in plcs.items():
+        plc.add_connection_listener(partial(publish_availability, plc_devices[name]))
+        publish_availability(plc_devices[name], plc.connected)
 
-    while True:
-        readings = plc.read_all()
-        for topic, value in readings.items():
-            parts = topic.split('/')
-            if len(parts) < 3:
-                continue
-            device = devices.get(parts[1])
-            if device:
-                device.rec_s7_data(parts[2], value)
-        await asyncio.sleep(update_time)
+    # Diagnostica: log dei cicli lenti e profilo su richiesta (SIGUSR1 o
+    # <mqtt_base>/_bridge/profile/set con il numero di cicli)
+    diag = cfg.get("diagnostics", {}) or {}
+    slow_cycle_ms = diag.get("slow_cycle_ms")
+    slow_threshold = float(slow_cycle_ms) / 1000 if slow_cycle_ms else None
+    profiler = ProfileCapture(diag.get("profile_dir", "."), diag.get("profile_cycles", 50))
+    if hasattr(signal, "SIGUSR1"):
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, profiler.start)
+        except (NotImplementedError, RuntimeError):  # pragma: no cover - loop senza segnali
+            pass
+    mqtt.add_command_handler(f"{cfg.get('mqtt_base', 's7')}/_bridge/profile/set", partial(_start_profile, profiler))
+
+    schedulers = []
+    for name, plc in plcs.items():
+        update_time = plc_cfgs[name].get("update_time", cfg.get("update_time", 1))
+        # Un ciclo indipendente per ogni gruppo di polling (poll_interval in ms)
+        for group in plc.poll_groups() or [None]:
+            period = group / 1000 if group else update_time
+            schedulers.append(PollScheduler(executors[name], partial(plc.read_group, group, changes_only=True), plc.dispatch, period, name=f"{name}-poll-{group or 'default'}", slow_threshold=slow_threshold, profiler=profiler))
+
+    # Endpoint Prometheus opzionale (metrics: {host, port})
+    metrics_server = None
+    metrics_cfg = cfg.get("metrics")
+    if metrics_cfg:
+        registry = MetricsRegistry()
+        register_pipeline(registry, plcs, schedulers, mqtt, devices)
+        metrics_server = registry.serve(metrics_cfg.get("host", "127.0.0.1"), int(metrics_cfg.get("port", 9108)))
+    try:
+        tasks = [s.run() for s in schedulers]
+        if discovery is not None:
+            tasks.append(discovery.run())
+        await asyncio.gather(*tasks)
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        for executor in executors.values():
+            executor.shutdown(wait=False)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="S7 PLC to MQTT bridge")
+    parser.add_argument("config", nargs="?", default="config.yaml")
+    parser.add_argument("--config-cache", help="file della cache del config compilato")
+    args = parser.parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.config, args.config_cache))
     except KeyboardInterrupt:
         pass
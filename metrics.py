@@ -0,0 +1,156 @@
+import logging
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+# Limiti superiori (secondi) dei bucket di default
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[Dict[str, str], Any]
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus semantics (``le`` bounds).
+
+    Observations are plain increments done by the thread owning the
+    measured component; the HTTP thread only reads them.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsRegistry:
+    """Metrics read from the live components at scrape time.
+
+    Each metric is registered with a ``collect`` callable returning
+    ``(labels, value)`` samples, where ``value`` is a number or a
+    :class:`Histogram`.  :meth:`render` produces the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics: List[Tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def register(self, name: str, kind: str, help_text: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        if kind not in {"counter", "gauge", "histogram"}:
+            raise ValueError(f"Tipo di metrica non valido: {kind}")
+        self._metrics.append((name, kind, help_text, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, kind, help_text, collect in self._metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in collect():
+                if kind != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets + (math.inf,), value.counts):
+                    cumulative += count
+                    le = dict(labels, le=_format_value(bound))
+                    lines.append(f"{name}_bucket{_format_labels(le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9108) -> ThreadingHTTPServer:
+        """Expose :meth:`render` on ``http://host:port/metrics`` from a daemon thread."""
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in {"/", "/metrics"}:
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # niente log per ogni scrape
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info("Metrics available on http://%s:%d/metrics", host, server.server_address[1])
+        return server
+
+
+def register_pipeline(registry: MetricsRegistry, plcs: Dict[str, Any], schedulers: list, mqtt, devices: Dict[str, Any]) -> None:
+    """Register the metrics of PLC clients, poll schedulers, devices and MQTT."""
+
+    def per_plc(attr: str):
+        return lambda: [({"plc": name}, getattr(plc, attr)) for name, plc in plcs.items()]
+
+    def per_scheduler(attr: str):
+        return lambda: [({"scheduler": s.name}, getattr(s, attr)) for s in schedulers]
+
+    registry.register("s7_poll_cycles_total", "counter", "Poll cycles run.", per_scheduler("cycles"))
+    registry.register("s7_poll_slow_cycles_total", "counter", "Poll cycles longer than diagnostics.slow_cycle_ms.", per_scheduler("slow_cycles"))
+    registry.register("s7_poll_overruns_total", "counter", "Poll deadlines skipped because a cycle overran.", per_scheduler("overruns"))
+    registry.register("s7_poll_cycle_seconds", "histogram", "Duration of a poll cycle (read and dispatch).", per_scheduler("cycle_time"))
+    registry.register("s7_poll_read_seconds", "histogram", "Time spent in the PLC read of a poll cycle.", per_scheduler("read_time"))
+    registry.register("s7_poll_dispatch_seconds", "histogram", "Time spent dispatching readings to the attributes.", per_scheduler("dispatch_time"))
+
+    registry.register("s7_plc_connected", "gauge", "1 when the PLC connection is up.", per_plc("connected"))
+    registry.register("s7_plc_reconnects_total", "counter", "Successful reconnections to the PLC.", per_plc("reconnects"))
+    registry.register("s7_plc_reads_total", "counter", "Read cycles (plans) executed.", per_plc("read_cycles"))
+    registry.register("s7_plc_read_requests_total", "counter", "S7 read requests sent.", per_plc("read_requests"))
+    registry.register("s7_plc_read_bytes_total", "counter", "Bytes read from the PLC.", per_plc("bytes_read"))
+    registry.register("s7_plc_last_read_requests", "gauge", "S7 requests of the last read cycle.", per_plc("last_read_requests"))
+    registry.register("s7_plc_decode_seconds", "histogram", "Time spent decoding the buffers of a read cycle.", per_plc("decode_time"))
+    registry.register("s7_plc_commands_total", "counter", "MQTT commands written to the PLC.", per_plc("commands_written"))
+    registry.register("s7_plc_commands_coalesced_total", "counter", "Commands replaced by a newer value before being written.", per_plc("commands_coalesced"))
+    registry.register("s7_plc_command_latency_seconds", "histogram", "Time from command reception to the end of the PLC write.", per_plc("command_latency"))
+
+    def per_device(attr: str):
+        return lambda: [
+            ({"device": name}, sum(getattr(a, attr) for a in dev.attributes.values())) for name, dev in devices.items()
+        ]
+
+    registry.register("s7_attribute_publishes_total", "counter", "Values published by the attributes of a device.", per_device("publish_count"))
+    registry.register("s7_attribute_filtered_total", "counter", "Readings not published (unchanged, deadband or update_interval).", per_device("filtered_count"))
+
+    def mqtt_value(attr: str):
+        return lambda: [({}, getattr(mqtt, attr))]
+
+    registry.register("s7_mqtt_sent_total", "counter", "Messages handed to the MQTT client.", mqtt_value("sent"))
+    registry.register("s7_mqtt_dropped_total", "counter", "Messages dropped because the outbound queue was full.", mqtt_value("dropped"))
+    registry.register("s7_mqtt_coalesced_total", "counter", "Pending messages replaced by a newer value for the same topic.", mqtt_value("coalesced"))
+    registry.register("s7_mqtt_queue_depth", "gauge", "Messages waiting in the outbound queue.", mqtt_value("queue_depth"))
+    registry.register("s7_mqtt_inflight", "gauge", "Messages published and not yet acknowledged.", mqtt_value("inflight"))
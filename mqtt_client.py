@@ -1,5 +1,9 @@
-from typing import Callable, Optional
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
 import logging
+import threading
+
+from . import tracing
 
 try:
     import paho.mqtt.client as mqtt
@@ -14,6 +18,13 @@ class MqttClient:
     is not available.  This allows the rest of the codebase to be executed in
     environments where third party packages cannot be installed (e.g. during
     tests in this kata).
+
+    Outgoing messages go through a bounded queue keyed by topic: a newer value
+    for a topic replaces the pending one, and when the queue is full the
+    oldest message is dropped.  At most ``max_inflight`` messages are handed
+    to paho at a time, so its internal queue cannot grow without bound while
+    the broker is slow or unreachable.  Messages published with ``on_sent``
+    are never dropped and call it once paho confirms them (``on_publish``).
     """
 
     def __init__(self, config: dict, message_callback: Optional[Callable[[str, str], None]] = None, client=None):
@@ -21,14 +32,36 @@ class MqttClient:
         self._published = []  # type: list[tuple[str, str, bool]]
         self._subscriptions = []
         self._client = client
+        self._message_callback = message_callback
+        # topic comando -> handler; una sola subscribe wildcard per base
+        self._command_handlers: Dict[str, Callable[[str], None]] = {}
+        self._command_wildcards = set()
+        # (filtro con wildcard, handler(topic, payload)) per gli altri topic
+        self._topic_handlers: list = []
+
+        # Coda di uscita limitata, un solo messaggio in attesa per topic
+        self.qos = int(config.get("qos", 0))
+        self.max_queue = int(config.get("max_queue", 10000))
+        self.max_inflight = int(config.get("max_inflight", 20))
+        self._queue: "OrderedDict[str, Tuple[str, bool, Callable[[], None] | None]]" = OrderedDict()
+        self._inflight = set()
+        # mid -> callback di conferma dei messaggi pubblicati con on_sent
+        self._on_sent: Dict[int, Callable[[], None]] = {}
+        self._acked_early = set()
+        self._sending = 0  # messaggi tolti dalla coda, dentro client.publish()
+        self._lock = threading.RLock()
+        self._connected = client is not None
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
         
         if self._client is None and mqtt is not None and config.get("host"): # aggiunto controllo host
             self._client = mqtt.Client()
-
-            if message_callback is not None:
-                def _on_message(client, userdata, msg):
-                    message_callback(msg.topic, msg.payload.decode())
-                self._client.on_message = _on_message
+            self._client.on_message = self._on_message
+            self._client.on_connect = self._on_connect
+            self._client.on_disconnect = self._on_disconnect
+            self._client.on_publish = self._on_publish
+            self._client.max_inflight_messages_set(self.max_inflight)
 
             if config.get("user"):
                 self._client.username_pw_set(config.get("user"), config.get("password"))
@@ -38,16 +71,115 @@ class MqttClient:
             self._client.connect(host,port)
             self._client.loop_start()
             logging.info("Connected to MQTT broker at %s:%d", host, port)
+
+    def _on_message(self, client, userdata, msg) -> None:
+        self.handle_message(msg.topic, msg.payload.decode())
+
+    def _on_connect(self, client, userdata, flags, rc, *args) -> None:
+        # Dopo una riconnessione bastano le poche subscribe wildcard; copia
+        # sotto lock perche' add_command_handler puo' girare su un altro thread
+        with self._lock:
+            wildcards = list(self._command_wildcards)
+        for wildcard in wildcards:
+            client.subscribe(wildcard, self.qos)
+        with self._lock:
+            self._connected = True
+            # Con QoS > 0 paho ritrasmette i messaggi in volo con lo stesso mid;
+            # con QoS 0 quelli non ancora scritti sono persi e non avranno ack
+            if not self.qos:
+                self._inflight.clear()
+                self._on_sent.clear()
+        self._drain()
+
+    def _on_disconnect(self, client, userdata, *args) -> None:
+        with self._lock:
+            self._connected = False
+
+    def _on_publish(self, client, userdata, mid, *args) -> None:
+        with self._lock:
+            if mid in self._inflight:
+                self._inflight.discard(mid)
+            elif self._sending:
+                # Ack arrivato prima che client.publish() restituisse il mid
+                self._acked_early.add(mid)
+            on_sent = self._on_sent.pop(mid, None)
+        if on_sent is not None:
+            on_sent()
+        self._drain()
+
+    def _drain(self) -> None:
+        # client.publish() fuori dal lock: paho chiama on_publish tenendo il
+        # proprio mutex, prenderli in ordine inverso porterebbe a un deadlock
+        while True:
+            with self._lock:
+                if not (
+                    self._connected and self._queue and len(self._inflight) + self._sending < self.max_inflight
+                ):
+                    return
+                topic, (payload, retain, on_sent) = self._queue.popitem(last=False)
+                self._sending += 1
+            info = None
+            try:
+                info = self._client.publish(topic, payload, qos=self.qos, retain=retain)
+            finally:
+                mid = getattr(info, "mid", None)
+                with self._lock:
+                    self._sending -= 1
+                    if mid is not None:
+                        if mid in self._acked_early:
+                            self._acked_early.discard(mid)
+                        else:
+                            self._inflight.add(mid)
+                            if on_sent is not None:
+                                self._on_sent[mid] = on_sent
+                                on_sent = None
+                        self.sent += 1
+                    if not self._sending:
+                        # Nessuna publish in corso: gli ack rimasti non hanno un mid da abbinare
+                        self._acked_early.clear()
+            if mid is None:
+                continue
+            if on_sent is not None:  # confermato prima di conoscerne il mid
+                on_sent()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
     # API compatible with mqtt_handler.js
-    def publish(self, topic: str, payload: str, retain: bool = False) -> None:
-        if self._client is not None:
-            self._client.publish(topic, payload, retain=retain)
-        else:  # pragma: no cover - used in tests
+    def publish(
+        self, topic: str, payload: str, retain: bool = False, on_sent: Callable[[], None] | None = None
+    ) -> None:
+        if self._client is None:  # pragma: no cover - used in tests
             self._published.append((topic, payload, retain))
+            if on_sent is not None:
+                on_sent()
+            return
+        with tracing.span("publish"):
+            with self._lock:
+                if topic in self._queue:
+                    self.coalesced += 1
+                elif len(self._queue) >= self.max_queue:
+                    self._drop_oldest()
+                self._queue[topic] = (payload, retain, on_sent)
+            self._drain()
+
+    def _drop_oldest(self) -> None:
+        # I messaggi con conferma (es. discovery) restano in coda
+        for old_topic, (_, _, on_sent) in self._queue.items():
+            if on_sent is None:
+                del self._queue[old_topic]
+                self.dropped += 1
+                logging.debug("MQTT queue full, dropped pending message for %s", old_topic)
+                return
 
     def subscribe(self, topic: str) -> None:
         if self._client is not None:
-            self._client.subscribe(topic)
+            self._client.subscribe(topic, self.qos)
         else:  # pragma: no cover - used in tests
             self._subscriptions.append(topic)
 
@@ -58,6 +190,62 @@ class MqttClient:
             if topic in self._subscriptions:
                 self._subscriptions.remove(topic)
 
+    def add_command_handler(self, topic: str, handler: Callable[[str], None]) -> None:
+        """Route messages on ``topic`` (``<base>/<device>/<attr>/set``) to ``handler``.
+
+        Instead of one SUBSCRIBE per topic, a single ``<base>/+/+/set``
+        wildcard is subscribed for each base and incoming messages are looked
+        up in a topic index.
+        """
+
+        wildcard = topic.rsplit("/", 3)[0] + "/+/+/set"
+        with self._lock:
+            new = wildcard not in self._command_wildcards
+            self._command_wildcards.add(wildcard)
+        if new:
+            self.subscribe(wildcard)
+        self._command_handlers[topic] = handler
+
+    def remove_command_handler(self, topic: str) -> None:
+        self._command_handlers.pop(topic, None)
+
+    def add_topic_handler(self, topic_filter: str, handler: Callable[[str, str], None]) -> None:
+        """Subscribe ``topic_filter`` (``+``/``#`` allowed) and pass its messages to ``handler``."""
+
+        self._topic_handlers.append((topic_filter, handler))
+        self.subscribe(topic_filter)
+
+    def remove_topic_handler(self, topic_filter: str) -> None:
+        self._topic_handlers = [(f, h) for f, h in self._topic_handlers if f != topic_filter]
+        self.unsubscribe(topic_filter)
+
+    @staticmethod
+    def topic_matches(topic_filter: str, topic: str) -> bool:
+        parts = topic.split("/")
+        for index, level in enumerate(topic_filter.split("/")):
+            if level == "#":
+                return True
+            if index >= len(parts) or (level != "+" and level != parts[index]):
+                return False
+        return len(parts) == len(topic_filter.split("/"))
+
+    def handle_message(self, topic: str, payload: str) -> None:
+        # Gira sul thread di rete di paho: un handler in errore non deve fermarlo
+        try:
+            handler = self._command_handlers.get(topic)
+            if handler is not None:
+                handler(payload)
+                return
+            matched = False
+            for topic_filter, topic_handler in self._topic_handlers:
+                if self.topic_matches(topic_filter, topic):
+                    topic_handler(topic, payload)
+                    matched = True
+            if not matched and self._message_callback is not None:
+                self._message_callback(topic, payload)
+        except Exception:
+            logging.exception("MQTT handler for %s failed", topic)
+
     def disconnect(self) -> None:
         if self._client is not None:
             self._client.loop_stop()
@@ -1,21 +1,75 @@
+import ctypes
 import logging
-import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict, Any
-from .utils import Utils
+from typing import Callable, Dict, Any, List, Tuple
+from . import tracing
+from .codec import BlockCodec, encode_value
+from .metrics import Histogram
+from .read_plan import ReadBlock, ReadChunk, build_read_plan, pack_multi_reads
+from .simulator import S7Simulator
+from .utils import AREA_DB, area_name, parse_address
+from .write_queue import PendingWrite, WriteQueue, pack_multi_writes
 
 try:
     import snap7
 except Exception:  # pragma: no cover - dependency may be missing
     snap7 = None
 
-@dataclass
+# Codici S7 usati negli item di read/write_multi_vars
+S7_AREA_DB = AREA_DB
+S7_WORDLEN_BYTE = 0x02
+DEFAULT_PDU = 240  # PDU minima garantita da ogni CPU S7
+
+
+class _S7DataItem(ctypes.Structure):
+    """Same layout as ``snap7.type.S7DataItem``, used when snap7 is missing."""
+
+    _pack_ = 1
+    _fields_ = [
+        ("Area", ctypes.c_int32),
+        ("WordLen", ctypes.c_int32),
+        ("Result", ctypes.c_int32),
+        ("DBNumber", ctypes.c_int32),
+        ("Start", ctypes.c_int32),
+        ("Amount", ctypes.c_int32),
+        ("pData", ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+
+def s7_data_item_type():
+    if snap7 is not None:
+        return snap7.type.S7DataItem
+    return _S7DataItem
+
+
+def _snap7_area(area: int):
+    """Area argument of ``read_area``/``write_area`` for the S7 area code."""
+
+    if snap7 is not None:
+        return snap7.type.Areas(area)
+    return area
+
+
+# Chiave del piano che comprende tutti gli item (read_all)
+_ALL = object()
+
+
+@dataclass(slots=True)
 class ParsedAddress:
     address: str
     db: int
     dtype: str
     byte: int
     bit: int
+    # Elementi di un array (0 = scalare) o lunghezza massima di una stringa
+    count: int = 0
+    # Codice area S7: DB oppure ingressi, uscite, merker (db = 0)
+    area: int = AREA_DB
 
 class PlcClient:
     """Minimal wrapper around python-snap7.
@@ -23,41 +77,255 @@ class PlcClient:
     The implementation stores PLC addresses associated with MQTT topics.  When
     running without the real `snap7` package a simple in-memory stub is used so
     that unit tests can exercise the higher level logic without requiring a
-    PLC connection.
+    PLC connection.  With ``simulate: true`` the full read/write path runs
+    against :class:`~.simulator.S7Simulator` instead.
     """
 
-    def __init__(self, config: dict, client=None):
-        self._client = client
+    def __init__(self, config: dict, client=None, clients: list | None = None):
         self._items: Dict[str, ParsedAddress] = {}
-        if self._client is None and snap7 is not None:
-            self._client = snap7.client.Client()
-            port = config.get("port", 102)
-            self._client.connect(config.get("host"), config.get("rack", 0), config.get("slot", 2), port)
-            logging.info("Connected to PLC at %s:%d", config.get("host"), port)
-        elif self._client is None:
+        # Byte non usati tollerati tra due item per unirli in un'unica lettura
+        self._read_gap = int(config.get("read_gap", 16))
+        # Ingressi, uscite e merker: di default tutto il range usato in un blocco
+        area_gap = config.get("area_read_gap")
+        self._area_gap = int(area_gap) if area_gap is not None else None
+        # Piani di lettura per gruppo di polling (chiave: intervallo in ms,
+        # None per il gruppo di default, _ALL per read_all)
+        self._groups: Dict[str, int | None] = {}
+        self._plans: Dict[Any, List[ReadBlock]] = {}
+        # Buffer grezzi dell'ultima lettura per blocco, per rilevare i cambi
+        self._previous: Dict[Any, List[Tuple[bytes, tuple] | None]] = {}
+        self._last_values: Dict[str, Any] = {}
+        self._always: set = set()
+        # topic -> handler dell'attributo (es. Attribute.rec_s7_data)
+        self._handlers: Dict[str, Callable[[Any], None]] = {}
+        self._deferred: List[Callable[[], None]] = []
+        # read_multi_vars: PDU letta dal client se non configurata
+        self._multi_read = bool(config.get("multi_read", True))
+        self._config_pdu: int | None = config.get("pdu_size")
+        self._pdu = self._config_pdu
+        # Scritture: bit sullo stesso byte unite, snapshot del poll come base
+        self._write_queue = WriteQueue()
+        self._batch_depth = 0
+        # Con una connessione dedicata le scritture girano su un thread proprio,
+        # in parallelo al poll: coda di scrittura e snapshot sotto lock
+        self._write_lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._multi_write = bool(config.get("multi_write", True))
+        self._snapshot_max_age = float(config.get("write_snapshot_age", 100)) / 1000
+        # Per gruppo: (area, db) -> blocchi letti (inizio, byte, istante)
+        self._snapshots: Dict[Any, Dict[Tuple[int, int], List[Tuple[int, bytearray, float]]]] = {}
+        # Comandi MQTT: accodati dal thread di rete, eseguiti dal thread di I/O
+        # del PLC; per ogni topic vale l'ultimo valore ricevuto
+        self._commands: Dict[str, Any] = {}
+        self._commands_lock = threading.Lock()
+        self._io_executor = None
+        self._commands_scheduled = False
+        self._io_loop = None
+        self.commands_coalesced = 0
+        # Dopo una scrittura gli item scritti vengono riletti subito
+        self._read_back = bool(config.get("read_back", True))
+        # Indirizzi di scrittura diversi da quello letto (set_plc)
+        self._write_items: Dict[str, ParsedAddress] = {}
+
+        # Stato della connessione e riconnessione con backoff esponenziale
+        self._host = config.get("host")
+        self._connect_args = (config.get("host"), config.get("rack", 0), config.get("slot", 2), config.get("port", 102))
+        self._reconnect_min = float(config.get("reconnect_min", 1))
+        self._reconnect_max = float(config.get("reconnect_max", 30))
+        self._backoff = self._reconnect_min
+        self._next_attempt = 0.0
+        self._disconnected_at = 0.0
+        self._listeners: List[Callable[[bool], None]] = []
+        self._connection_lock = threading.Lock()
+        self.connected = True
+        self.reconnects = 0
+
+        # Metriche (lette dall'endpoint di metrics.py)
+        self.read_cycles = 0
+        self.read_requests = 0
+        self.last_read_requests = 0
+        self.bytes_read = 0
+        self.decode_time = Histogram()
+        self.commands_written = 0
+        self.command_latency = Histogram()
+        self.last_recovery: float | None = None
+
+        # Pool di connessioni: con piu' di una connessione la prima e' riservata
+        # alle scritture e le altre leggono i blocchi in parallelo
+        if clients is None and client is not None:
+            clients = [client]
+        if clients is None:
+            clients = self._open_connections(config)
+        self._clients = clients
+        self._client = clients[0] if clients else None
+        self._read_clients = clients[1:] if len(clients) > 1 else clients
+        self._dedicated_writes = len(clients) > 1
+        self._pool = (
+            ThreadPoolExecutor(max_workers=len(self._read_clients), thread_name_prefix="plc-read")
+            if len(self._read_clients) > 1 else None
+        )
+
+    def _open_connections(self, config: dict) -> list:
+        count = max(1, int(config.get("connections", 1)))
+        if config.get("simulate"):
+            # Tutte le connessioni vedono lo stesso PLC simulato
+            logging.info("Using simulated PLC")
+            return [S7Simulator.from_config(config.get("simulator") or {})] * count
+        if snap7 is None:
             logging.warning("snap7 package not available, running in stub mode")
+            return []
+        clients = [snap7.client.Client() for _ in range(count)]
+        try:
+            for client in clients:
+                client.connect(*self._connect_args)
+        except Exception as exc:  # pragma: no cover - PLC unreachable at startup
+            logging.warning("Connection to PLC at %s failed (%s), retrying in background", self._host, exc)
+            self._set_disconnected(retry_now=True)
+        else:
+            logging.info("Connected to PLC at %s:%d (%d connections)", self._host, self._connect_args[3], count)
+        return clients
+
+    def add_connection_listener(self, listener: Callable[[bool], None]) -> None:
+        """Call ``listener(connected)`` whenever the connection state changes."""
+
+        self._listeners.append(listener)
 
-    def add_item(self, topic: str, address: ParsedAddress | str) -> None:
+    def _notify(self, connected: bool) -> None:
+        for listener in self._listeners:
+            try:
+                listener(connected)
+            except Exception:  # pragma: no cover - listener errors
+                logging.exception("Connection listener failed")
+
+    def _set_disconnected(self, retry_now: bool = False) -> None:
+        with self._connection_lock:
+            if not self.connected:
+                return
+            now = time.monotonic()
+            self.connected = False
+            self._disconnected_at = now
+            self._backoff = self._reconnect_min
+            self._next_attempt = now if retry_now else now + self._backoff
+        if not retry_now:
+            logging.warning("Lost connection to PLC at %s", self._host)
+        self._notify(False)
+
+    def _check_connection(self, client) -> None:
+        """Mark the PLC disconnected when ``client`` lost its connection."""
+
+        try:
+            alive = client.get_connected()
+        except AttributeError:
+            return  # client senza stato di connessione
+        except Exception:  # pragma: no cover - broken client
+            alive = False
+        if not alive:
+            self._set_disconnected()
+
+    def _ensure_connected(self) -> bool:
+        """Return the connection state, reconnecting when the backoff expired.
+
+        While disconnected a cycle costs one time check instead of one failing
+        request per block.
+        """
+
+        if self.connected:
+            return True
+        with self._connection_lock:
+            # Poll e thread di scrittura possono arrivare qui insieme
+            return self._reconnect()
+
+    def _reconnect(self) -> bool:
+        if self.connected:
+            return True
+        now = time.monotonic()
+        if now < self._next_attempt:
+            return False
+        try:
+            for client in {id(c): c for c in self._clients}.values():
+                try:
+                    client.disconnect()
+                except Exception:  # pragma: no cover - already closed
+                    pass
+                client.connect(*self._connect_args)
+        except Exception as exc:
+            self._next_attempt = now + self._backoff
+            logging.warning(
+                "Reconnect to PLC at %s failed (%s), next attempt in %.1fs", self._host, exc, self._backoff
+            )
+            self._backoff = min(self._backoff * 2, self._reconnect_max)
+            return False
+        self.connected = True
+        self.reconnects += 1
+        self.last_recovery = now - self._disconnected_at
+        self._backoff = self._reconnect_min
+        # PDU rinegoziata e valori ripubblicati dopo la riconnessione
+        self._pdu = self._config_pdu
+        self._previous.clear()
+        logging.info("Reconnected to PLC at %s after %.1fs", self._host, self.last_recovery)
+        self._notify(True)
+        return True
+
+    def add_item(self, topic: str, address: ParsedAddress | str, group: int | None = None, track_changes: bool = True) -> None:
+        """Register ``address`` under ``topic``.
+
+        ``group`` is the poll interval in ms of the item; items with the same
+        interval share a read plan (see :meth:`read_group`).  ``None`` selects
+        the default poll rate.  Items with ``track_changes`` disabled are
+        returned on every read, even with ``changes_only``.
+        """
+
+        topic = sys.intern(topic)
+        self._plans.clear()
+        with self._snapshot_lock:
+            self._snapshots.clear()
+        self._previous.clear()
+        self._groups[topic] = group
+        if track_changes:
+            self._always.discard(topic)
+        else:
+            self._always.add(topic)
         if isinstance(address, ParsedAddress):
             self._items[topic] = address
             return
         try:
-            db, dtype, byte, bit = Utils()._parse_address(address)
-            self._items[topic] = ParsedAddress(address, db, dtype, byte, bit)
+            parsed = parse_address(address)
         except ValueError:
-            # Store placeholder; parsing will be attempted when used
-            self._items[topic] = ParsedAddress(address, 0, "", 0, 0)
+            # Indirizzo non valido: l'item non viene registrato
+            logging.error("Ignoring %s: unsupported address format %s", topic, address)
+            self._groups.pop(topic, None)
+            self._always.discard(topic)
+            self._items.pop(topic, None)
+            return
+        self._items[topic] = ParsedAddress(address, *parsed)
 
-    def write_item(self, topic: str, value: Any) -> None:
-        """Write a single item to the PLC.
+    def set_write_address(self, topic: str, address: str) -> None:
+        """Send writes for ``topic`` to ``address`` instead of its read address.
+
+        An invalid ``address`` is logged and writes keep going to the read
+        address.
+        """
+
+        try:
+            parsed = parse_address(address)
+        except ValueError:
+            logging.error("Ignoring write address of %s: unsupported address format %s", topic, address)
+            self._write_items.pop(topic, None)
+            return
+        self._write_items[topic] = ParsedAddress(address, *parsed)
+
+    def queue_write(self, topic: str, value: Any) -> None:
+        """Stage a write without sending it; see :meth:`flush_writes`.
 
-        The method always stores the value in an in-memory dictionary so that
+        The value is always stored in an in-memory dictionary so that
         :meth:`read_all` can fall back to it when the real ``snap7`` package is
-        unavailable (e.g. during tests).  When a snap7 client is present the
-        address for the given topic is translated and forwarded to
-        ``write_area``.
+        unavailable (e.g. during tests).
         """
 
+        with self._write_lock:
+            self._stage(topic, value)
+
+    def _stage(self, topic: str, value: Any) -> None:
         if not hasattr(self, "_written"):
             self._written = {}
         self._written[topic] = value
@@ -65,56 +333,381 @@ class PlcClient:
         if self._client is None:
             return
 
-        item = self._items.get(topic)
+        item = self._write_items.get(topic) or self._items.get(topic)
         if item is None:  # pragma: no cover - misconfiguration
             return
 
         try:
-            if not item.dtype:
-                db, dtype, byte, bit = Utils()._parse_address(item.address)
-                item.db, item.dtype, item.byte, item.bit = db, dtype, byte, bit
-            db, dtype, byte, bit = item.db, item.dtype, item.byte, item.bit
-            dt = dtype
+            if item.dtype == "X" and item.count:
+                bits = list(value)
+                if len(bits) != item.count:
+                    raise ValueError(f"{item.count} valori attesi, ricevuti {len(bits)}")
+                for i, bit in enumerate(bits, item.bit):
+                    self._write_queue.stage_bit(item.db, item.byte + i // 8, i % 8, bool(bit), item.area)
+            elif item.dtype == "X":
+                self._write_queue.stage_bit(item.db, item.byte, item.bit, bool(value), item.area)
+            else:
+                self._write_queue.stage_bytes(item.db, item.byte, encode_value(item, value), item.area)
+        except (TypeError, ValueError, OverflowError) as exc:
+            logging.error("Failed to write address %s: %s", item.address, exc)
 
-            area = snap7.type.Areas.DB if snap7 is not None else 0
+    def bind(self, topic: str, handler: Callable[[Any], None]) -> None:
+        """Route values read for ``topic`` straight to ``handler``."""
 
-            if dt == "X":
-                # Leggi il byte esistente per preservare gli altri bit
-                existing_byte = 0
+        self._handlers[topic] = handler
+
+    def dispatch(self, readings: Dict[str, Any]) -> None:
+        """Hand every reading to the handler bound with :meth:`bind`.
+
+        Callbacks registered with :meth:`defer` during the dispatch run once
+        at its end (e.g. the aggregated JSON of a device).
+        """
+
+        handlers = self._handlers
+        for topic, value in readings.items():
+            handler = handlers.get(topic)
+            if handler is not None:
+                # Un handler difettoso non deve fermare gli altri attributi
                 try:
-                    current = self._client.read_area(area, db, byte, 1)
-                    if current and len(current) >= 1:
-                        existing_byte = current[0]
+                    handler(value)
                 except Exception:
-                    logging.debug("Impossibile leggere il byte esistente per %s, procedo con 0.", item.address)
-                if not (0 <= bit <= 7):
-                    raise ValueError(f"bit fuori range (0..7): {bit}")
-                if value:
-                    new_byte = existing_byte | (1 << bit)
-                else:
-                    new_byte = existing_byte & ~(1 << bit)
-                raw = bytes([new_byte])
-            elif dt == "B":
-                raw = int(value).to_bytes(1, byteorder="big", signed=False)
-            elif dt in {"W", "I"}:
-                # INT16 signed
-                raw = int(value).to_bytes(2, byteorder="big", signed=True)
-            elif dt == "D":
-                # DWORD unsigned 32 or float when value is float
-                if isinstance(value, float):
-                    raw = struct.pack(">f", float(value))
-                else:
-                    raw = int(value).to_bytes(4, byteorder="big", signed=False)
-            elif dt == "R":
-                # REAL float32
-                raw = struct.pack(">f", float(value))
+                    logging.exception("Handler for %s failed", topic)
+        if self._deferred:
+            deferred, self._deferred = self._deferred, []
+            for callback in deferred:
+                try:
+                    callback()
+                except Exception:
+                    logging.exception("Deferred dispatch callback failed")
+
+    def defer(self, callback: Callable[[], None]) -> None:
+        """Run ``callback`` at the end of the current dispatch."""
+
+        self._deferred.append(callback)
+
+    def write_item(self, topic: str, value: Any) -> None:
+        """Write a single item to the PLC.
+
+        The value is staged with :meth:`queue_write` and sent right away,
+        unless a :meth:`batch_writes` block is active, in which case it goes
+        out together with the other staged writes when the block ends.
+        """
+
+        with self._write_lock:
+            self.queue_write(topic, value)
+            if not self._batch_depth:
+                self.flush_writes()
+
+    def set_io_executor(self, executor, loop=None) -> None:
+        """Run queued commands on ``executor`` as soon as they arrive.
+
+        ``executor`` must be the single-threaded PLC I/O executor that also
+        runs the poll cycles, so reads and writes never overlap.  With a
+        dedicated write connection (``connections`` > 1) commands run on a
+        thread of their own instead and never wait for a running poll.
+        Without an executor commands wait for the next :meth:`read_group`.
+        The values read back after the writes are dispatched on ``loop`` (the
+        event loop running the poll schedulers).
+        """
+
+        if self._dedicated_writes and executor is not None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plc-write")
+        self._io_executor = executor
+        self._io_loop = loop
+
+    def submit_write(self, topic: str, value: Any) -> None:
+        """Queue a write coming from another thread (e.g. the MQTT network loop).
+
+        A newer value for ``topic`` replaces the one still waiting.  The queue
+        is drained by :meth:`process_commands` on the PLC I/O thread.
+        """
+
+        with self._commands_lock:
+            # La latenza parte dal primo comando in attesa per il topic
+            pending = self._commands.get(topic)
+            if pending is not None:
+                self.commands_coalesced += 1
+            self._commands[topic] = (value, pending[1] if pending else time.perf_counter())
+            schedule = self._io_executor is not None and not self._commands_scheduled
+            if schedule:
+                self._commands_scheduled = True
+        if schedule:
+            try:
+                self._io_executor.submit(self._run_commands)
+            except RuntimeError:  # executor chiuso allo shutdown
+                pass
+
+    def _run_commands(self) -> None:
+        readings = self.process_commands()
+        if readings and self._io_loop is not None:
+            self._io_loop.call_soon_threadsafe(self.dispatch, readings)
+
+    def process_commands(self) -> Dict[str, Any]:
+        """Write every queued command in one batch.
+
+        The written items are then read back with a request limited to their
+        byte ranges (their read address, which may differ from ``set_plc``)
+        and the values are returned, so the new state can be published
+        without waiting for the next poll cycle.
+        """
+
+        with self._commands_lock:
+            commands, self._commands = self._commands, {}
+            self._commands_scheduled = False
+        if not commands:
+            return {}
+        with self.batch_writes():
+            for topic, (value, _) in commands.items():
+                self.queue_write(topic, value)
+        now = time.perf_counter()
+        for _, received in commands.values():
+            self.command_latency.observe(now - received)
+        self.commands_written += len(commands)
+        if not self._read_back:
+            return {}
+        return self.read_items(commands)
+
+    @contextmanager
+    def batch_writes(self):
+        """Collect the writes issued inside the block and flush them once."""
+
+        with self._write_lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.flush_writes()
+
+    def _snapshot_blocks(self, area: int, db: int):
+        with self._snapshot_lock:
+            snapshots = list(self._snapshots.values())
+        for snapshot in snapshots:
+            yield from snapshot.get((area, db), ())
+
+    def _snapshot_bytes(self, area: int, db: int, start: int, size: int) -> bytearray | None:
+        """Bytes from the last poll when they are recent enough, else ``None``."""
+
+        limit = time.monotonic() - self._snapshot_max_age
+        for block_start, buf, stamp in self._snapshot_blocks(area, db):
+            if block_start <= start and start + size <= block_start + len(buf) and stamp >= limit:
+                return buf[start - block_start:start - block_start + size]
+        return None
+
+    def _patch_snapshot(self, write: PendingWrite) -> None:
+        for block_start, buf, _ in self._snapshot_blocks(write.area, write.db):
+            lo = max(block_start, write.start)
+            hi = min(block_start + len(buf), write.end)
+            if lo < hi:
+                buf[lo - block_start:hi - block_start] = write.data[lo - write.start:hi - write.start]
+
+    def flush_writes(self) -> None:
+        """Send every staged write.
+
+        Bytes only partially defined by bit writes are completed with the last
+        poll snapshot when it is at most ``write_snapshot_age`` ms old,
+        otherwise with a single read of the missing ranges.  The resulting
+        ranges are sent with ``write_multi_vars`` when possible.
+        """
+
+        with self._write_lock:
+            self._flush(self._write_queue.take())
+
+    def _flush(self, writes: List[PendingWrite]) -> None:
+        if not writes or self._client is None:
+            return
+        if not self._ensure_connected():
+            logging.warning("PLC at %s not connected, dropping %d pending write(s)", self._host, len(writes))
+            return
+
+        missing = []
+        for w in writes:
+            if not w.partial:
+                continue
+            base = self._snapshot_bytes(w.area, w.db, w.start, len(w.data))
+            if base is None:
+                missing.append(w)
             else:
-                raise ValueError(f"Tipo non supportato: {dtype}")
-            self._client.write_area(area, db, byte, raw)
-        except Exception:  # pragma: no cover - connection/parsing errors
-            logging.exception("Failed to write address %s", item.address)
+                w.apply_base(base)
+        if missing:
+            blocks = [ReadBlock(w.db, w.start, len(w.data), area=w.area) for w in missing]
+            for w, raw in zip(missing, self._read_blocks(blocks, [self._client])):
+                if raw is None:
+                    logging.debug(
+                        "Impossibile leggere il byte esistente per %s.%d, procedo con 0.", area_name(w.area, w.db), w.start
+                    )
+                    raw = bytes(len(w.data))
+                w.apply_base(raw)
+
+        for w in writes:
+            self._patch_snapshot(w)
+
+        if not (len(writes) > 1 and self._multi_write and hasattr(self._client, "write_multi_vars")):
+            for w in writes:
+                try:
+                    self._client.write_area(_snap7_area(w.area), w.db, w.start, w.data)
+                except Exception as exc:
+                    self._check_connection(self._client)
+                    logging.error(
+                        "Failed to write address range %s.%d-%d: %s", area_name(w.area, w.db), w.start, w.end - 1, exc
+                    )
+            return
+
+        item_type = s7_data_item_type()
+        for batch in pack_multi_writes(writes, self._pdu_length()):
+            items = (item_type * len(batch))()
+            sources = []
+            for item, w in zip(items, batch):
+                source = (ctypes.c_uint8 * len(w.data)).from_buffer(w.data)
+                item.Area = w.area
+                item.WordLen = S7_WORDLEN_BYTE
+                item.DBNumber = w.db
+                item.Start = w.start
+                item.Amount = len(w.data)
+                item.pData = ctypes.cast(source, ctypes.POINTER(ctypes.c_uint8))
+                sources.append(source)
+            try:
+                self._client.write_multi_vars(items)
+            except Exception as exc:
+                self._check_connection(self._client)
+                logging.error("Failed multi-var write of %d items: %s", len(batch), exc)
+                continue
+            for item, w in zip(items, batch):
+                if item.Result != 0:
+                    logging.error("Failed to write address range %s.%d-%d", area_name(w.area, w.db), w.start, w.end - 1)
+
+    def poll_groups(self) -> List[int | None]:
+        """Poll intervals (ms) in use; ``None`` is the default rate."""
+
+        return sorted(set(self._groups.values()), key=lambda g: (g is not None, g or 0))
+
+    def _build_plan(self, group: Any = _ALL, topics=None) -> List[ReadBlock]:
+        items: Dict[str, ParsedAddress] = {}
+        for topic, item in self._items.items():
+            if group is not _ALL and self._groups.get(topic) != group:
+                continue
+            if topics is not None and topic not in topics:
+                continue
+            items[topic] = item
+        plan = build_read_plan(items, self._read_gap, self._area_gap)
+        for block in plan:
+            block.codec = BlockCodec(block, self._always)
+        return plan
+
+    def _pdu_length(self) -> int:
+        if self._pdu is None:
+            try:
+                self._pdu = int(self._client.get_pdu_length())
+            except Exception:  # pragma: no cover - client without PDU info
+                self._pdu = DEFAULT_PDU
+        return self._pdu
+
+    def _read_blocks(self, plan: List[ReadBlock], clients: list | None = None, poll: bool = False) -> List[bytes | None]:
+        """Fetch the raw bytes of every block; failed blocks map to ``None``.
+
+        With a connection pool the requests are spread over the read
+        connections and run in parallel threads.  ``clients`` forces the
+        connections to use (e.g. the write connection).  ``poll`` marks the
+        read of a poll cycle, the only one counted in ``last_read_requests``.
+        """
+
+        data = [bytearray(block.size) for block in plan]
+        failed: set = set()
+        # Il trace e' del thread chiamante, i thread del pool lo ricevono qui
+        trace = tracing.current()
+        if self._multi_read and hasattr(self._client, "read_multi_vars"):
+            jobs = pack_multi_reads(plan, self._pdu_length())
+
+            def run(client, batch):
+                started = time.perf_counter()
+                self._read_multi(client, batch, data, failed)
+                if trace is not None:
+                    label = f"{len(batch)} item/{sum(c.size for c in batch)} B"
+                    trace.block(label, time.perf_counter() - started)
+        else:
+            jobs = list(range(len(plan)))
 
-    def read_all(self) -> Dict[str, Any]:
+            def run(client, index):
+                started = time.perf_counter()
+                block = plan[index]
+                self._read_single(client, block, index, data, failed)
+                if trace is not None:
+                    label = f"{area_name(block.area, block.db)}.{block.start}-{block.end - 1}"
+                    trace.block(label, time.perf_counter() - started)
+
+        pool = self._pool if clients is None else None
+        clients = clients or self._read_clients
+        if pool is not None and len(jobs) > 1:
+            parts = [jobs[i::len(clients)] for i in range(len(clients))]
+            for _ in pool.map(lambda c, part: [run(c, job) for job in part], clients, parts):
+                pass
+        else:
+            for job in jobs:
+                run(clients[0], job)
+
+        buffers: List[bytes | None] = []
+        for index, block in enumerate(plan):
+            if index in failed:
+                buffers.append(None)
+            else:
+                buffers.append(bytes(data[index]))
+                self.bytes_read += plan[index].size
+        self.read_requests += len(jobs)
+        if poll:
+            self.last_read_requests = len(jobs)
+        return buffers
+
+    def _read_single(self, client, block: ReadBlock, index: int, data: List[bytearray], failed: set) -> None:
+        if not self.connected:
+            failed.add(index)
+            return
+        try:
+            data[index][:] = client.read_area(_snap7_area(block.area), block.db, block.start, block.size)
+        except Exception as exc:
+            failed.add(index)
+            self._check_connection(client)
+            if self.connected:
+                logging.error(
+                    "Failed to read address range %s.%d-%d: %s",
+                    area_name(block.area, block.db), block.start, block.end - 1, exc,
+                )
+
+    def _read_multi(self, client, batch: List[ReadChunk], data: List[bytearray], failed: set) -> None:
+        if not self.connected:
+            failed.update(chunk.block for chunk in batch)
+            return
+        items = (s7_data_item_type() * len(batch))()
+        targets = []
+        for item, chunk in zip(items, batch):
+            target = (ctypes.c_uint8 * chunk.size)()
+            item.Area = chunk.area
+            item.WordLen = S7_WORDLEN_BYTE
+            item.DBNumber = chunk.db
+            item.Start = chunk.start
+            item.Amount = chunk.size
+            item.pData = ctypes.cast(target, ctypes.POINTER(ctypes.c_uint8))
+            targets.append(target)
+        try:
+            client.read_multi_vars(items)
+        except Exception as exc:
+            failed.update(chunk.block for chunk in batch)
+            self._check_connection(client)
+            if self.connected:
+                logging.error("Failed multi-var read of %d items: %s", len(batch), exc)
+            return
+        for item, chunk, target in zip(items, batch, targets):
+            if item.Result != 0:
+                if chunk.block not in failed:
+                    logging.error(
+                        "Failed to read address range %s.%d-%d",
+                        area_name(chunk.area, chunk.db), chunk.start, chunk.start + chunk.size - 1,
+                    )
+                failed.add(chunk.block)
+            else:
+                data[chunk.block][chunk.offset:chunk.offset + chunk.size] = bytes(target)
+
+    def read_all(self, changes_only: bool = False) -> Dict[str, Any]:
         """Read all configured items from the PLC.
 
         Each stored address is expected to use the S7 DB notation, e.g.::
@@ -123,47 +716,122 @@ class PlcClient:
             DB1.DBW2     # 16-bit int (signed)
             DB1.DBD4     # 32-bit dword (unsigned)  or  DB1.DBR4 / DB1.R4 for REAL
 
+        Inputs, outputs and markers (``I0.0``, ``QW4``, ``MB100``) are also
+        accepted; each of these areas is read as one bulk snapshot of its used
+        range (see ``area_read_gap``).
+
+        Items are grouped by DB and nearby byte ranges (up to ``read_gap``
+        unused bytes apart) are fetched with a single ``read_area`` call; the
+        values are then sliced out of the returned buffer.  When the client
+        supports ``read_multi_vars`` the blocks are packed into as few
+        requests as the negotiated PDU length allows.
+
+        With ``changes_only`` the raw buffer of every block is compared with
+        the one of the previous read and only items whose bytes (or bit)
+        changed are decoded and returned.
+
         When the snap7 client is not available the method falls back to the
         in-memory values written via :meth:`write_item` so that tests can run
         without a real PLC connection.
         """
 
+        return self._read(_ALL, changes_only)
+
+    def read_group(self, group: int | None, changes_only: bool = False) -> Dict[str, Any]:
+        """Read only the items registered with poll interval ``group``."""
+
+        return self._read(group, changes_only)
+
+    def read_items(self, topics) -> Dict[str, Any]:
+        """Read only ``topics``, with a one-off plan covering their byte ranges."""
+
+        if self._client is None:
+            written = getattr(self, "_written", {})
+            return {topic: written.get(topic, 0) for topic in topics if topic in self._items}
+        if not self._ensure_connected():
+            return {}
         result: Dict[str, Any] = {}
-        for topic, item in self._items.items():
-            if self._client is None:
-                # Provide previously written values if available, otherwise 0.
-                result[topic] = getattr(self, "_written", {}).get(topic, 0)
-                continue
+        plan = self._build_plan(_ALL, topics)
+        for block, raw in zip(plan, self._read_blocks(plan, [self._client])):
+            if raw is not None:
+                block.codec.decode(block.codec.unpack(raw), result)
+        return result
 
-            try:
-                if not item.dtype:
-                    db, dtype, byte, bit = Utils()._parse_address(item.address)
-                    item.db, item.dtype, item.byte, item.bit = db, dtype, byte, bit
-                db, dtype, byte, bit = item.db, item.dtype, item.byte, item.bit
-                size = {
-                    "X": 1,  # indirizzabile a byte
-                    "B": 1,
-                    "W": 2,  # word 16-bit
-                    "I": 2,  # int16 signed
-                    "D": 4,  # dword 32-bit unsigned
-                    "R": 4,  # real 32-bit
-                }[dtype]
-                area = snap7.type.Areas.DB if snap7 is not None else 0
-                raw = self._client.read_area(area, db, byte, size)
-
-                if dtype == "X":
-                    result[topic] = bool(raw[0] & (1 << bit))
-                elif dtype == "B":
-                    result[topic] = raw[0]
-                elif dtype in {"W", "I"}:
-                    result[topic] = int.from_bytes(raw, byteorder="big", signed=True)
-                elif dtype == "D":
-                    result[topic] = int.from_bytes(raw, byteorder="big", signed=False)
-                elif dtype == "R":
-                    result[topic] = struct.unpack(">f", raw)[0]
-                else:
-                    raise ValueError(f"Tipo non supportato: {dtype}")
-            except Exception:  # pragma: no cover - connection/parsing errors
-                logging.exception("Failed to read address %s", item.address)
+    def _read(self, group: Any, changes_only: bool = False) -> Dict[str, Any]:
+        # Le scritture in coda passano prima della lettura, sullo stesso thread
+        readback = None
+        # Con il thread di scrittura dedicato i comandi non passano dal poll
+        if self._commands and not (self._dedicated_writes and self._io_executor is not None):
+            with tracing.span("commands"):
+                readback = self.process_commands()
+        result = self._read_values(group, changes_only)
+        if readback:
+            for topic, value in readback.items():
+                result.setdefault(topic, value)
         return result
 
+    def _read_values(self, group: Any, changes_only: bool = False) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        if self._client is None:
+            # Provide previously written values if available, otherwise 0.
+            written = getattr(self, "_written", {})
+            for topic in self._items:
+                if group is _ALL or self._groups.get(topic) == group:
+                    value = written.get(topic, 0)
+                    if changes_only and topic not in self._always and self._last_values.get(topic, _ALL) == value:
+                        continue
+                    self._last_values[topic] = value
+                    result[topic] = value
+            return result
+
+        if not self._ensure_connected():
+            return result
+
+        plan = self._plans.get(group)
+        if plan is None:
+            with tracing.span("plan"):
+                plan = self._plans[group] = self._build_plan(group)
+
+        with tracing.span("read"):
+            buffers = self._read_blocks(plan, poll=True)
+        started = time.perf_counter()
+        previous = self._previous.get(group) if changes_only else None
+        current: List[Tuple[bytes, tuple] | None] = []
+
+        snapshot: Dict[Tuple[int, int], List[Tuple[int, bytearray, float]]] = {}
+        now = time.monotonic()
+        for index, (block, raw) in enumerate(zip(plan, buffers)):
+            old = previous[index] if previous else None
+            if raw is None:
+                current.append(None)
+                continue
+            snapshot.setdefault((block.area, block.db), []).append((block.start, bytearray(raw), now))
+            codec = block.codec
+            if old is not None and old[0] == raw:
+                current.append(old)
+                if codec.always:
+                    codec.decode_changes(old[1], old[1], result)
+                continue
+            try:
+                fields = codec.unpack(raw)
+            except Exception:  # pragma: no cover - short buffer
+                logging.exception(
+                    "Failed to read address range %s.%d-%d", area_name(block.area, block.db), block.start, block.end - 1
+                )
+                current.append(None)
+                continue
+            current.append((raw, fields))
+            if old is None:
+                codec.decode(fields, result)
+            else:
+                codec.decode_changes(old[1], fields, result)
+        self._previous[group] = current
+        with self._snapshot_lock:
+            self._snapshots[group] = snapshot
+        self.read_cycles += 1
+        elapsed = time.perf_counter() - started
+        self.decode_time.observe(elapsed)
+        trace = tracing.current()
+        if trace is not None:
+            trace.add("decode", elapsed)
+        return result
@@ -0,0 +1,143 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple, TYPE_CHECKING
+
+from .utils import AREA_DB
+
+if TYPE_CHECKING:  # pragma: no cover - imported for annotations only
+    from .plc_client import ParsedAddress
+
+# Numero di byte occupati da ogni tipo PLC
+TYPE_SIZES = {
+    "X": 1,  # indirizzabile a byte
+    "B": 1,
+    "W": 2,  # word 16-bit
+    "I": 2,  # int16 signed
+    "D": 4,  # dword 32-bit unsigned
+    "R": 4,  # real 32-bit
+    "DINT": 4,  # int32 signed
+    "LR": 8,  # lreal 64-bit
+    "DTL": 12,  # anno, mese, giorno, giorno settimana, h, m, s, ns
+}
+
+
+def item_size(item: "ParsedAddress") -> int:
+    """Bytes read for ``item``, arrays and strings included."""
+
+    if item.dtype == "STRING":
+        return 2 + item.count  # lunghezza massima e attuale, poi i caratteri
+    if item.dtype == "WSTRING":
+        return 4 + 2 * item.count
+    if item.count and item.dtype == "X":
+        return (item.bit + item.count + 7) // 8
+    return TYPE_SIZES[item.dtype] * (item.count or 1)
+
+
+@dataclass
+class ReadBlock:
+    """Contiguous byte range of a DB (or I/Q/M area) fetched with a single request.
+
+    ``items`` holds ``(topic, parsed_address)`` pairs whose bytes are fully
+    contained in ``[start, start + size)``.  ``codec`` is the
+    :class:`~.codec.BlockCodec` compiled for the block by the client.
+    ``area`` is the S7 area code (``db`` is zero outside the DB area).
+    """
+
+    db: int
+    start: int
+    size: int
+    items: List[Tuple[str, "ParsedAddress"]] = field(default_factory=list)
+    codec: Any = None
+    area: int = AREA_DB
+
+    @property
+    def end(self) -> int:
+        return self.start + self.size
+
+
+def build_read_plan(
+    items: Dict[str, "ParsedAddress"], max_gap: int = 0, area_gap: int | None = None
+) -> List[ReadBlock]:
+    """Group parsed items by area and DB and merge nearby byte ranges.
+
+    Two items end up in the same block when the gap between the end of the
+    current block and the start of the next item is at most ``max_gap`` bytes.
+    Reading a few unused bytes is much cheaper than an extra round trip.
+    Inputs, outputs and markers use ``area_gap`` instead; with ``None`` the
+    whole used range of each area is a single snapshot block (split over
+    requests only by the PDU size).
+    """
+
+    by_db: Dict[Tuple[int, int], List[Tuple[str, "ParsedAddress"]]] = {}
+    for topic, item in items.items():
+        by_db.setdefault((item.area, item.db), []).append((topic, item))
+
+    blocks: List[ReadBlock] = []
+    for area, db in sorted(by_db, key=lambda k: (k[0] != AREA_DB, k)):
+        gap = max_gap if area == AREA_DB else area_gap
+        entries = sorted(by_db[(area, db)], key=lambda e: (e[1].byte, item_size(e[1])))
+        block = None
+        for topic, item in entries:
+            end = item.byte + item_size(item)
+            if block is not None and (gap is None or item.byte <= block.end + gap):
+                block.size = max(block.end, end) - block.start
+            else:
+                block = ReadBlock(db, item.byte, end - item.byte, area=area)
+                blocks.append(block)
+            block.items.append((topic, item))
+    return blocks
+
+
+# Limiti del protocollo S7 per ReadVar con piu' item
+MAX_VARS = 20  # item per richiesta (MaxVars di snap7)
+_REQ_HEADER = 12  # header S7 + codice funzione e numero item
+_REQ_ITEM = 12
+_RES_HEADER = 14
+_RES_ITEM = 4
+
+
+@dataclass
+class ReadChunk:
+    """Part of a :class:`ReadBlock` fetched as one item of a multi-var request."""
+
+    block: int  # indice del blocco nel piano
+    db: int
+    start: int
+    size: int
+    offset: int  # posizione relativa all'inizio del blocco
+    area: int = AREA_DB
+
+
+def pack_multi_reads(blocks: List[ReadBlock], pdu: int, max_vars: int = MAX_VARS) -> List[List[ReadChunk]]:
+    """Pack blocks into ``read_multi_vars`` batches sized to the PDU length.
+
+    Each batch respects both the request size (12 bytes per item) and the
+    response size (4 bytes per item plus data, padded to even length) as well
+    as the ``max_vars`` item limit.  Blocks that do not fit in the remaining
+    space of a batch are split, so the number of requests grows with the
+    number of bytes read rather than with the number of blocks.
+    """
+
+    batches: List[List[ReadChunk]] = []
+    current: List[ReadChunk] = []
+    req, res = _REQ_HEADER, _RES_HEADER
+    for index, block in enumerate(blocks):
+        offset = 0
+        while offset < block.size:
+            room = pdu - res - _RES_ITEM
+            size = min(block.size - offset, room)
+            if size & 1 and size + 1 > room:
+                size -= 1
+            if size < 1 or len(current) >= max_vars or req + _REQ_ITEM > pdu:
+                if not current:
+                    raise ValueError(f"PDU troppo piccola: {pdu}")
+                batches.append(current)
+                current = []
+                req, res = _REQ_HEADER, _RES_HEADER
+                continue
+            current.append(ReadChunk(index, block.db, block.start + offset, size, offset, block.area))
+            req += _REQ_ITEM
+            res += _RES_ITEM + size + (size & 1)
+            offset += size
+    if current:
+        batches.append(current)
+    return batches
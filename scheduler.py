@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable
+
+from . import tracing
+from .metrics import Histogram
+
+
+class PollScheduler:
+    """Run PLC poll cycles with a fixed period.
+
+    The blocking ``read_fn`` runs on ``executor`` (a dedicated PLC I/O
+    thread) so the event loop stays free, and its result is handed to
+    ``dispatch_fn`` on the loop.  Cycles are scheduled against a monotonic
+    deadline: the period does not drift with the read time, and when a cycle
+    overruns the missed deadlines are skipped and counted instead of being
+    run back to back.
+
+    Every cycle is traced (see :mod:`.tracing`): cycles longer than
+    ``slow_threshold`` seconds log their per-stage breakdown, and
+    ``profiler`` captures cProfile/tracemalloc data when armed.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        read_fn: Callable[[], Any],
+        dispatch_fn: Callable[[Any], None],
+        period: float,
+        name: str = "poll",
+        slow_threshold: float | None = None,
+        profiler: tracing.ProfileCapture | None = None,
+    ):
+        if period <= 0:
+            raise ValueError(f"Periodo di polling non valido: {period}")
+        self._executor = executor
+        self._read_fn = read_fn
+        self._dispatch_fn = dispatch_fn
+        self.period = float(period)
+        self.name = name
+        self.cycles = 0
+        self.overruns = 0
+        self.last_duration = 0.0
+        self.cycle_time = Histogram()
+        self.read_time = Histogram()
+        self.dispatch_time = Histogram()
+        self.slow_threshold = slow_threshold
+        self.slow_cycles = 0
+        self.last_trace: tracing.CycleTrace | None = None
+        self._profiler = profiler
+        self._running = False
+
+    def _traced(self, trace: tracing.CycleTrace, fn: Callable, *args):
+        # Eseguita sul thread di I/O (lettura) o sul loop (dispatch)
+        tracing.activate(trace)
+        try:
+            if self._profiler is not None:
+                return self._profiler.run(fn, *args)
+            return fn(*args)
+        finally:
+            tracing.activate(None)
+
+    def stop(self) -> None:
+        self._running = False
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._running = True
+        deadline = time.monotonic()
+        while self._running:
+            started = time.monotonic()
+            trace = tracing.CycleTrace(self.name)
+            try:
+                result = await loop.run_in_executor(self._executor, self._traced, trace, self._read_fn)
+                read_done = time.monotonic()
+                # io: attesa del thread di I/O compresa; il dettaglio lo aggiunge il client
+                trace.add("io", read_done - started)
+                self.read_time.observe(read_done - started)
+                self._traced(trace, self._dispatch_fn, result)
+                dispatch_done = time.monotonic()
+                trace.add("dispatch", dispatch_done - read_done)
+                self.dispatch_time.observe(dispatch_done - read_done)
+            except Exception:  # pragma: no cover - errors must not stop polling
+                logging.exception("Poll cycle %s failed", self.name)
+            self.cycles += 1
+            now = time.monotonic()
+            self.last_duration = now - started
+            self.cycle_time.observe(self.last_duration)
+            self.last_trace = trace
+            if self.slow_threshold is not None and self.last_duration > self.slow_threshold:
+                self.slow_cycles += 1
+                logging.warning(
+                    "Slow poll cycle %s: %.1f ms (%s)", self.name, self.last_duration * 1000, trace.format()
+                )
+            if self._profiler is not None:
+                self._profiler.cycle_done()
+
+            deadline += self.period
+            if now > deadline:
+                missed = int((now - deadline) // self.period) + 1
+                self.overruns += missed
+                deadline += missed * self.period
+                logging.debug(
+                    "Poll cycle %s took %.3fs, skipped %d deadline(s)", self.name, self.last_duration, missed
+                )
+            if self._running:
+                await asyncio.sleep(deadline - now)
@@ -0,0 +1,166 @@
+import ctypes
+import time
+from typing import Dict
+
+from .read_plan import MAX_VARS
+from .utils import AREA_DB, AREA_INPUTS, AREA_MARKERS, AREA_OUTPUTS, area_name
+
+_READ_OVERHEAD = 18  # header risposta + header item
+
+
+class S7Simulator:
+    """In-memory S7 PLC implementing the subset of the snap7 client API used
+    by :class:`~.plc_client.PlcClient`.
+
+    Data blocks are real ``bytearray`` objects.  Every request sleeps
+    ``latency`` seconds to mimic the network round trip and multi-variable
+    requests are validated against the PDU size, as a real CPU would do.
+    ``requests`` and ``bytes_read``/``bytes_written`` count the traffic.
+    With ``default_db_size`` unknown DBs are created on first access.
+    Inputs, outputs and markers are ``areas`` of ``area_size`` bytes, keyed
+    by S7 area code (``0x81``, ``0x82``, ``0x83``).
+    Setting ``online`` to ``False`` simulates a PLC that dropped off the
+    network: requests and reconnects fail until it is set back.
+    """
+
+    def __init__(
+        self,
+        dbs: Dict[int, int] | None = None,
+        latency: float = 0.0,
+        pdu: int = 480,
+        default_db_size: int = 0,
+        area_size: int = 1024,
+    ):
+        self.dbs: Dict[int, bytearray] = {}
+        self.areas: Dict[int, bytearray] = {
+            code: bytearray(area_size) for code in (AREA_INPUTS, AREA_OUTPUTS, AREA_MARKERS)
+        }
+        self.default_db_size = int(default_db_size)
+        self.latency = float(latency)
+        self.pdu = int(pdu)
+        self.connected = True
+        self.online = True
+        self.requests = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        for number, size in (dbs or {}).items():
+            self.add_db(number, size)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "S7Simulator":
+        dbs = {int(k): int(v) for k, v in (config.get("dbs") or {}).items()}
+        return cls(
+            dbs,
+            float(config.get("latency_ms", 0)) / 1000,
+            int(config.get("pdu", 480)),
+            int(config.get("default_db_size", 65536)),
+            int(config.get("area_size", 1024)),
+        )
+
+    def add_db(self, number: int, size: int) -> bytearray:
+        self.dbs[number] = bytearray(size)
+        return self.dbs[number]
+
+    def reset_counters(self) -> None:
+        self.requests = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    # --- API compatibile con snap7.client.Client ---------------------------------
+
+    def connect(self, address: str, rack: int, slot: int, tcp_port: int = 102) -> None:
+        if not self.online:
+            raise RuntimeError("TCP : Unreachable peer")
+        self.connected = True
+
+    def disconnect(self) -> None:
+        self.connected = False
+
+    def get_connected(self) -> bool:
+        return self.connected
+
+    def get_pdu_length(self) -> int:
+        return self.pdu
+
+    def _round_trip(self, count: int = 1) -> None:
+        if not self.online:
+            self.connected = False
+        if not self.connected:
+            raise RuntimeError("ISO : Not connected")
+        self.requests += count
+        if self.latency:
+            time.sleep(self.latency * count)
+
+    def _db(self, dbnumber: int, start: int, size: int) -> bytearray:
+        db = self.dbs.get(dbnumber)
+        if db is None and self.default_db_size:
+            db = self.add_db(dbnumber, self.default_db_size)
+        if db is None or start < 0 or start + size > len(db):
+            raise RuntimeError(f"CPU : Address out of range (DB{dbnumber}.{start}+{size})")
+        return db
+
+    def _memory(self, area, dbnumber: int, start: int, size: int) -> bytearray:
+        area = int(getattr(area, "value", area))  # snap7.type.Areas o codice
+        if area == AREA_DB:
+            return self._db(dbnumber, start, size)
+        memory = self.areas.get(area)
+        if memory is None:
+            raise RuntimeError(f"CPU : Item not available (area {area:#x})")
+        if start < 0 or start + size > len(memory):
+            raise RuntimeError(f"CPU : Address out of range ({area_name(area, dbnumber)}{start}+{size})")
+        return memory
+
+    def read_area(self, area, dbnumber: int, start: int, size: int) -> bytearray:
+        # snap7 divide le letture grandi in piu' PDU
+        chunk = self.pdu - _READ_OVERHEAD
+        self._round_trip(max(1, -(-size // chunk)))
+        db = self._memory(area, dbnumber, start, size)
+        self.bytes_read += size
+        return bytearray(db[start:start + size])
+
+    def write_area(self, area, dbnumber: int, start: int, data) -> None:
+        chunk = self.pdu - 28
+        self._round_trip(max(1, -(-len(data) // chunk)))
+        db = self._memory(area, dbnumber, start, len(data))
+        db[start:start + len(data)] = data
+        self.bytes_written += len(data)
+
+    def read_multi_vars(self, items):
+        if len(items) > MAX_VARS:
+            raise RuntimeError("CLI : Too many items (>20) in multi read/write")
+        request = 12 + 12 * len(items)
+        response = 14 + sum(4 + i.Amount + (i.Amount & 1) for i in items)
+        if request > self.pdu or response > self.pdu:
+            raise RuntimeError("CLI : Size over PDU length")
+        self._round_trip()
+        for item in items:
+            try:
+                db = self._memory(item.Area, item.DBNumber, item.Start, item.Amount)
+            except RuntimeError:
+                db = None
+            if db is None:
+                item.Result = 0x00A00000  # errCliItemNotAvailable
+                continue
+            ctypes.memmove(item.pData, bytes(db[item.Start:item.Start + item.Amount]), item.Amount)
+            item.Result = 0
+            self.bytes_read += item.Amount
+        return 0, items
+
+    def write_multi_vars(self, items) -> int:
+        if len(items) > MAX_VARS:
+            raise RuntimeError("CLI : Too many items (>20) in multi read/write")
+        if 12 + sum(16 + i.Amount + (i.Amount & 1) for i in items) > self.pdu:
+            raise RuntimeError("CLI : Size over PDU length")
+        self._round_trip()
+        for item in items:
+            try:
+                db = self._memory(item.Area, item.DBNumber, item.Start, item.Amount)
+            except RuntimeError:
+                db = None
+            if db is None:
+                item.Result = 0x00A00000
+                continue
+            db[item.Start:item.Start + item.Amount] = bytes(item.pData[:item.Amount])
+            item.Result = 0
+            self.bytes_written += item.Amount
+        return 0
@@ -21,6 +21,28 @@ class AttributeTest(unittest.TestCase):
         self.assertEqual(attr.format_message('10', 'B')[1], 10)
         self.assertAlmostEqual(attr.format_message('1.5', 'R')[1], 1.5)
         self.assertEqual(attr.format_message('foo', 'R')[0], -2)
+        self.assertEqual(attr.format_message('-70000', 'DINT')[1], -70000)
+        self.assertEqual(attr.format_message(' abc ', 'STRING', count=5)[1], ' abc ')
+        self.assertEqual(attr.format_message('toolong', 'STRING', count=5)[0], -2)
+        self.assertEqual(attr.format_message('[1, 2.5]', 'R', count=2)[1], (1.0, 2.5))
+        self.assertEqual(attr.format_message('[true, 0]', 'X', count=2)[1], (True, False))
+        self.assertEqual(attr.format_message('[1]', 'R', count=2)[0], -2)
+        self.assertEqual(attr.format_message('2024-13-01', 'DTL')[0], -2)
+
+    def test_array_published_as_json(self):
+        mqtt = DummyMqtt()
+        attr = Attribute(DummyPlc(), mqtt, 'trend', 'dev')
+        attr.parsed_plc_address = pc.ParsedAddress('DB5.DBR0[2]', 5, 'R', 0, 0, 2)
+        attr.rec_s7_data((1.100000023841858, 2.0))
+        self.assertEqual(mqtt.published[-1][1], '[1.1, 2.0]')
+
+    def test_inverted_bit_array_inverts_each_element(self):
+        mqtt = DummyMqtt()
+        attr = Attribute(DummyPlc(), mqtt, 'flags', 'dev')
+        attr.parsed_plc_address = pc.ParsedAddress('DB5.DBX0.0[3]', 5, 'X', 0, 0, 3)
+        attr.boolean_inverted = True
+        attr.rec_s7_data((True, False, True))
+        self.assertEqual(mqtt.published[-1][1], '[false, true, false]')
 
     def test_rec_s7_data_publishes(self):
         mqtt = DummyMqtt()
@@ -31,6 +53,57 @@ class AttributeTest(unittest.TestCase):
         attr.rec_s7_data(True)
         self.assertEqual(mqtt.published[0][0], 'dev/state')
         self.assertEqual(mqtt.published[0][1], 'True')
+    def test_set_topics_share_one_wildcard_subscription(self):
+        mqtt = DummyMqtt()
+        plc = DummyPlc()
+        attrs = []
+        for i in range(3):
+            attr = Attribute(plc, mqtt, 'state', f's7/dev{i}')
+            attr.parsed_plc_address = pc.ParsedAddress(f'DB1.DBB{i}', 1, 'B', i, 0)
+            attr.subscribe_plc_updates()
+            attr.set_RW('rw')
+            attrs.append(attr)
+        self.assertEqual(mqtt.subscriptions, ['s7/+/+/set'])
+        mqtt.handle_message('s7/dev1/state/set', '7')
+        self.assertEqual(plc.read_all()['s7/dev1/state'], 7)
+        attrs[1].set_RW('r')
+        mqtt.handle_message('s7/dev1/state/set', '9')
+        self.assertEqual(plc.read_all()['s7/dev1/state'], 7)
+
+    def _real_attr(self, mqtt):
+        attr = Attribute(DummyPlc(), mqtt, 'flow', 'dev')
+        attr.parsed_plc_address = pc.ParsedAddress('DB1.DBR0', 1, 'R', 0, 0)
+        return attr
+
+    def test_deadband_filters_noise(self):
+        mqtt = DummyMqtt()
+        attr = self._real_attr(mqtt)
+        attr.deadband = 0.5
+        attr.deadband_pct = 1
+        for value in (100.0, 100.4, 100.9, 101.2, 102.5):
+            attr.rec_s7_data(value)
+        # limite max(0.5, 1% del valore pubblicato)
+        self.assertEqual([p for _, p, _ in mqtt.published], ['100.0', '101.2', '102.5'])
+
+    def test_threshold_with_hysteresis(self):
+        mqtt = DummyMqtt()
+        attr = self._real_attr(mqtt)
+        attr.threshold = 80
+        attr.hysteresis = 1
+        for value in (79.8, 80.4, 80.6, 80.0, 79.6, 79.4):
+            attr.rec_s7_data(value)
+        self.assertEqual([p for _, p, _ in mqtt.published], ['False', 'True', 'False'])
+
+    def test_max_age_republishes_unchanged_value(self):
+        mqtt = DummyMqtt()
+        attr = self._real_attr(mqtt)
+        attr.max_age = 1000
+        attr.rec_s7_data(1.0)
+        attr.rec_s7_data(1.0)
+        self.assertEqual(len(mqtt.published), 1)
+        attr.last_update -= 1000
+        attr.rec_s7_data(1.0)
+        self.assertEqual(len(mqtt.published), 2)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,90 @@
+import struct
+import unittest
+
+from pys7tomqtt.codec import BlockCodec, encode_value
+from pys7tomqtt.plc_client import ParsedAddress
+from pys7tomqtt.read_plan import build_read_plan
+
+
+class BlockCodecTest(unittest.TestCase):
+    def setUp(self):
+        items = {
+            "bit0": ParsedAddress("DB1.DBX0.0", 1, "X", 0, 0),
+            "bit7": ParsedAddress("DB1.DBX0.7", 1, "X", 0, 7),
+            "byte": ParsedAddress("DB1.DBB0", 1, "B", 0, 0),
+            "word": ParsedAddress("DB1.DBW0", 1, "W", 0, 0),  # sovrapposto a DBB0
+            "dword": ParsedAddress("DB1.DBD4", 1, "D", 4, 0),
+            "real": ParsedAddress("DB1.DBR12", 1, "R", 12, 0),
+        }
+        self.block = build_read_plan(items, max_gap=16)[0]
+        self.codec = BlockCodec(self.block, always=["dword"])
+        self.buf = bytes([0x81, 0x02, 0, 0]) + (70000).to_bytes(4, "big") + bytes(4) + struct.pack(">f", 2.5)
+
+    def test_single_struct_with_extras_for_overlaps(self):
+        self.assertEqual(self.codec.struct.format, ">B3xI4xf")
+        self.assertEqual(len(self.codec.extras), 1)
+        out = {}
+        self.codec.decode(self.codec.unpack(self.buf), out)
+        self.assertEqual(out, {"bit0": True, "bit7": True, "byte": 0x81, "word": -32510, "dword": 70000, "real": 2.5})
+
+    def test_decode_changes_only_reports_changed_bits(self):
+        old = self.codec.unpack(self.buf)
+        new = self.codec.unpack(bytes([0x80]) + self.buf[1:])
+        out = {}
+        self.codec.decode_changes(old, new, out)
+        self.assertEqual(out, {"bit0": False, "byte": 0x80, "word": -32766, "dword": 70000})
+
+
+class ComplexTypesCodecTest(unittest.TestCase):
+    def test_arrays_strings_and_dtl_decoded_as_one_field(self):
+        items = {
+            "trend": ParsedAddress("DB5.DBR0[3]", 5, "R", 0, 0, 3),
+            "flags": ParsedAddress("DB5.DBX12.6[4]", 5, "X", 12, 6, 4),
+            "count": ParsedAddress("DB5.DBDINT14", 5, "DINT", 14, 0),
+            "total": ParsedAddress("DB5.DBLR18", 5, "LR", 18, 0),
+            "name": ParsedAddress("DB5.DBSTRING26.4", 5, "STRING", 26, 0, 4),
+            "label": ParsedAddress("DB5.DBWSTRING32.2", 5, "WSTRING", 32, 0, 2),
+            "stamp": ParsedAddress("DB5.DBDTL40", 5, "DTL", 40, 0),
+        }
+        block = build_read_plan(items, max_gap=16)[0]
+        self.assertEqual(block.size, 52)
+        codec = BlockCodec(block)
+        buf = (
+            struct.pack(">3f", 1.5, -2.0, 0.25)
+            + bytes([0b11000000, 0b00000010])
+            + struct.pack(">id", -70000, 1.25)
+            + bytes([4, 2]) + b"ok\0\0"
+            + struct.pack(">HH", 2, 1) + "è".encode("utf-16-be") + bytes(2)
+            + struct.pack(">HBBBBBBI", 2024, 5, 1, 4, 12, 30, 5, 250_000_000)
+        )
+        out = {}
+        codec.decode(codec.unpack(buf), out)
+        self.assertEqual(out, {
+            "trend": (1.5, -2.0, 0.25),
+            "flags": (True, True, False, True),
+            "count": -70000,
+            "total": 1.25,
+            "name": "ok",
+            "label": "è",
+            "stamp": "2024-05-01T12:30:05.250000",
+        })
+
+        changed = bytearray(buf)
+        changed[4:8] = struct.pack(">f", 3.0)
+        new, out = codec.unpack(bytes(changed)), {}
+        codec.decode_changes(codec.unpack(buf), new, out)
+        self.assertEqual(out, {"trend": (1.5, 3.0, 0.25)})
+
+    def test_encode_round_trip(self):
+        string = ParsedAddress("DB1.DBSTRING0.8", 1, "STRING", 0, 0, 8)
+        self.assertEqual(encode_value(string, "abc"), bytes([8, 3]) + b"abc")
+        array = ParsedAddress("DB1.DBDINT0[2]", 1, "DINT", 0, 0, 2)
+        self.assertEqual(encode_value(array, [1, -1]), struct.pack(">2i", 1, -1))
+        with self.assertRaises(ValueError):
+            encode_value(array, [1])
+        dtl = ParsedAddress("DB1.DBDTL0", 1, "DTL", 0, 0)
+        self.assertEqual(encode_value(dtl, "2024-05-05T00:00:01"), struct.pack(">HBBBBBBI", 2024, 5, 5, 1, 0, 0, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+import pys7tomqtt.plc_client as pc
+pc.snap7 = None
+
+from pys7tomqtt.device_factory import device_factory
+from pys7tomqtt.mqtt_client import MqttClient
+from pys7tomqtt.plc_client import PlcClient
+
+
+class DeviceFactoryTest(unittest.TestCase):
+    def test_readings_are_dispatched_to_attributes(self):
+        plc = PlcClient({}, client=None)
+        mqtt = MqttClient({}, client=None)
+        devices = {}
+        config = {"type": "light", "name": "lamp", "state": "DB1.DBX0.0", "brightness": "DB1.DBB1"}
+        dev = device_factory(devices, plc, mqtt, config, "s7", False, "ha", False)
+        devices[dev.mqtt_name] = dev
+
+        plc.write_item("s7/lamp/brightness", 42)
+        plc.dispatch(plc.read_all(changes_only=True))
+        self.assertIn(("s7/lamp/state", "0", False), mqtt.published)
+        self.assertIn(("s7/lamp/brightness", "42", False), mqtt.published)
+
+    def test_invalid_address_registers_no_set_handler(self):
+        plc = PlcClient({}, client=None)
+        mqtt = MqttClient({}, client=None)
+        config = {"type": "sensor", "name": "x", "state": {"plc": "DB1.FOO", "rw": "rw"}}
+        dev = device_factory({}, plc, mqtt, config, "s7", False, "ha", False)
+        self.assertNotIn("state", dev.attributes)
+        self.assertNotIn("s7/x/state/set", mqtt._command_handlers)
+        mqtt.handle_message("s7/x/state/set", "true")  # ignorato
+
+    def test_threshold_rejected_on_non_numeric_address(self):
+        plc = PlcClient({}, client=None)
+        mqtt = MqttClient({}, client=None)
+        for address in ("DB1.DBSTRING0.10", "DB1.DBW0[2]"):
+            config = {"type": "sensor", "name": "x", "state": {"plc": address, "threshold": 5}}
+            with self.assertRaises(ValueError):
+                device_factory({}, plc, mqtt, config, "s7", False, "ha", False)
+
+    def test_json_publish_mode_aggregates_one_message_per_cycle(self):
+        plc = PlcClient({}, client=None)
+        mqtt = MqttClient({}, client=None)
+        config = {"type": "light", "name": "lamp", "state": "DB1.DBX0.0", "brightness": "DB1.DBB1"}
+        device_factory({}, plc, mqtt, config, "s7", False, "ha", False, publish_mode="json")
+
+        plc.dispatch(plc.read_all(changes_only=True))
+        self.assertEqual(mqtt.published, [("s7/lamp/attributes", '{"state": 0, "brightness": 0}', False)])
+        plc.write_item("s7/lamp/brightness", 5)
+        plc.dispatch(plc.read_all(changes_only=True))
+        self.assertEqual(mqtt.published[-1], ("s7/lamp/attributes", '{"state": 0, "brightness": 5}', False))
+        self.assertEqual(len(mqtt.published), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import pys7tomqtt.plc_client as pc
+pc.snap7 = None
+
+from pys7tomqtt.device_factory import device_factory
+from pys7tomqtt.discovery import DiscoveryPublisher
+from pys7tomqtt.mqtt_client import MqttClient
+from pys7tomqtt.plc_client import PlcClient
+
+
+class FakePaho:
+    def __init__(self):
+        self.mid = 0
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.mid += 1
+        return SimpleNamespace(mid=self.mid, rc=0)
+
+
+def make_devices(mqtt, names):
+    plc = PlcClient({}, client=None)
+    devices = {}
+    for name in names:
+        cfg = {"type": "sensor", "name": name, "state": "DB1.DBW0"}
+        dev = device_factory(devices, plc, mqtt, cfg, "s7", False, "ha", True)
+        devices[dev.mqtt_name] = dev
+    return devices
+
+
+class DiscoveryPublisherTest(unittest.TestCase):
+    def test_only_changed_configs_are_republished(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state = os.path.join(directory, "state.json")
+            mqtt = MqttClient({}, client=None)
+            devices = make_devices(mqtt, ["a", "b"])
+            first = DiscoveryPublisher(mqtt, retain=True, state_file=state, rate=0)
+            first.queue_devices(devices.values())
+            asyncio.run(first.run())
+            self.assertEqual(first.sent, 2)
+
+            devices["b"].attributes["state"].unit_of_measurement = "W"
+            second = DiscoveryPublisher(mqtt, retain=True, state_file=state, rate=0)
+            second.queue_devices(devices.values())
+            asyncio.run(second.run())
+            self.assertEqual((second.sent, second.skipped), (1, 1))
+            self.assertEqual(mqtt.published[-1][0], "ha/sensor/s7-connector/b/config")
+            self.assertTrue(mqtt.published[-1][2])
+
+    def test_unconfirmed_configs_are_not_recorded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state = os.path.join(directory, "state.json")
+            paho = FakePaho()
+            mqtt = MqttClient({"qos": 1}, client=paho)
+            mqtt._on_disconnect(paho, None, 0)  # i messaggi restano in coda
+            publisher = DiscoveryPublisher(mqtt, retain=True, state_file=state, rate=0, confirm_timeout=0.05)
+            publisher.queue("ha/a/config", "{}")
+            with self.assertLogs(level="WARNING"):
+                asyncio.run(publisher.run())
+            self.assertEqual(publisher.unconfirmed, 1)
+
+            again = DiscoveryPublisher(mqtt, retain=True, state_file=state)
+            again.queue("ha/a/config", "{}")
+            self.assertEqual((again.pending, again.skipped), (1, 0))
+
+            mqtt._on_connect(paho, None, {}, 0)
+            mqtt._on_publish(paho, None, 1)
+            self.assertEqual(publisher.unconfirmed, 0)
+
+    def test_retained_configs_on_broker_are_compared(self):
+        mqtt = MqttClient({}, client=None)
+        devices = make_devices(mqtt, ["a", "b"])
+        publisher = DiscoveryPublisher(mqtt, retain=True)
+        topic_filter = "ha/+/s7-connector/+/config"
+        mqtt.add_topic_handler(topic_filter, publisher.observe_retained)
+        topic, payload = devices["a"].discovery_message()
+        mqtt.handle_message(topic, payload)
+        mqtt.remove_topic_handler(topic_filter)
+        publisher.queue_devices(devices.values())
+        self.assertEqual((publisher.pending, publisher.skipped), (1, 1))
+
+    def test_sending_is_paced(self):
+        mqtt = MqttClient({}, client=None)
+        publisher = DiscoveryPublisher(mqtt, rate=100)
+        for i in range(4):
+            publisher.queue(f"t{i}", "{}")
+        loop = asyncio.new_event_loop()
+        started = loop.time()
+        loop.run_until_complete(publisher.run())
+        self.assertGreaterEqual(loop.time() - started, 0.03)
+        loop.close()
+        self.assertEqual(len(mqtt.published), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pys7tomqtt import utils
+from pys7tomqtt.main import load_config, plc_configs
+
+
+class PlcConfigsTest(unittest.TestCase):
+    def test_single_plc_section_is_default(self):
+        self.assertEqual(plc_configs({"plc": {"host": "a"}}), {"default": {"host": "a"}})
+
+    def test_named_plcs(self):
+        cfg = {"plcs": [{"name": "line1", "host": "a"}, {"host": "b"}]}
+        self.assertEqual(list(plc_configs(cfg)), ["line1", "plc2"])
+
+    def test_duplicate_names_rejected(self):
+        with self.assertRaises(ValueError):
+            plc_configs({"plcs": [{"name": "x"}, {"name": "x"}]})
+
+
+CONFIG = """
+devices:
+  - type: light
+    name: lamp
+    state: DB1.DBX0.0
+    brightness:
+      plc: DB1.DBB1
+      set_plc: DB1.DBB2
+"""
+
+
+class LoadConfigTest(unittest.TestCase):
+    def test_cache_skips_yaml_and_address_parsing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.yaml")
+            cache = os.path.join(directory, "config.cache")
+            with open(path, "w") as f:
+                f.write(CONFIG)
+            cfg = load_config(path, cache)
+            self.assertTrue(os.path.exists(cache))
+
+            utils._PARSED.clear()
+            with mock.patch("pys7tomqtt.main.yaml.load", side_effect=AssertionError("yaml parsed")):
+                self.assertEqual(load_config(path, cache), cfg)
+            self.assertEqual(utils._PARSED["DB1.DBB2"], (1, "B", 2, 0, 0, 0x84))
+
+            # config modificato: la cache non vale piu'
+            with open(path, "a") as f:
+                f.write("update_time: 2\n")
+            self.assertEqual(load_config(path, cache)["update_time"], 2)
+
+    def test_invalid_address_is_reported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.yaml")
+            with open(path, "w") as f:
+                f.write(CONFIG.replace("DB1.DBB2", "DB1.FOO"))
+            with self.assertLogs(level="WARNING") as logs:
+                load_config(path)
+            self.assertIn("DB1.FOO", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import urllib.request
+
+from pys7tomqtt.metrics import Histogram, MetricsRegistry, register_pipeline
+from pys7tomqtt.mqtt_client import MqttClient
+from pys7tomqtt.plc_client import PlcClient
+from pys7tomqtt.simulator import S7Simulator
+
+
+class HistogramTest(unittest.TestCase):
+    def test_render_cumulative_buckets(self):
+        hist = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3):
+            hist.observe(value)
+        registry = MetricsRegistry()
+        registry.register("t_seconds", "histogram", "Test.", lambda: [({"plc": "a"}, hist)])
+        text = registry.render()
+        self.assertIn('t_seconds_bucket{plc="a",le="0.1"} 2', text)
+        self.assertIn('t_seconds_bucket{plc="a",le="1.0"} 3', text)
+        self.assertIn('t_seconds_bucket{plc="a",le="+Inf"} 4', text)
+        self.assertIn('t_seconds_count{plc="a"} 4', text)
+
+
+class PipelineMetricsTest(unittest.TestCase):
+    def test_endpoint_exposes_plc_and_mqtt_counters(self):
+        plc = PlcClient({}, client=S7Simulator({1: 64}))
+        plc.add_item("a", "DB1.DBW0")
+        plc.add_item("b", "DB1.DBW40")
+        plc.read_all()
+        plc.submit_write("a", 3)
+        plc.read_all()
+
+        registry = MetricsRegistry()
+        register_pipeline(registry, {"main": plc}, [], MqttClient({}), {})
+        server = registry.serve("127.0.0.1", 0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            text = urllib.request.urlopen(url, timeout=5).read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('s7_plc_reads_total{plc="main"} 2', text)
+        # due poll da 2 blocchi di 2 byte in una richiesta, piu' la rilettura di "a"
+        self.assertIn('s7_plc_read_requests_total{plc="main"} 3', text)
+        self.assertIn('s7_plc_read_bytes_total{plc="main"} 10', text)
+        self.assertIn('s7_plc_commands_total{plc="main"} 1', text)
+        self.assertIn('s7_plc_command_latency_seconds_count{plc="main"} 1', text)
+        self.assertIn("s7_mqtt_queue_depth 0", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from pys7tomqtt.mqtt_client import MqttClient
+
+
+class FakePaho:
+    def __init__(self):
+        self.sent = []
+        self.subscribed = []
+        self._mid = 0
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self._mid += 1
+        self.sent.append((topic, payload, qos, retain))
+        return SimpleNamespace(mid=self._mid, rc=0)
+
+    def subscribe(self, topic, qos=0):
+        self.subscribed.append((topic, qos))
+
+
+class OutboundQueueTest(unittest.TestCase):
+    def test_inflight_limit_and_coalescing(self):
+        paho = FakePaho()
+        mqtt = MqttClient({"max_inflight": 2, "qos": 1}, client=paho)
+        for i in range(3):
+            mqtt.publish("a", str(i))
+        mqtt.publish("b", "x")
+        mqtt.publish("c", "1")
+        mqtt.publish("c", "2")
+        # "a" parte subito, poi "a"=1 e' in volo; "a"=2 e "c" aspettano
+        self.assertEqual([(t, p) for t, p, _, _ in paho.sent], [("a", "0"), ("a", "1")])
+        self.assertEqual(mqtt.queue_depth, 3)
+        self.assertEqual(mqtt.coalesced, 1)
+        self.assertEqual(paho.sent[0][2], 1)
+
+        mqtt._on_publish(paho, None, 1)
+        mqtt._on_publish(paho, None, 2)
+        self.assertEqual([(t, p) for t, p, _, _ in paho.sent[2:]], [("a", "2"), ("b", "x")])
+        mqtt._on_publish(paho, None, 3)
+        self.assertEqual(paho.sent[-1][:2], ("c", "2"))
+        self.assertEqual(mqtt.queue_depth, 0)
+        self.assertEqual(mqtt.sent, 5)
+
+    def test_full_queue_drops_oldest(self):
+        paho = FakePaho()
+        mqtt = MqttClient({"max_queue": 2}, client=paho)
+        mqtt._on_disconnect(paho, None, 0)
+        for topic in ("a", "b", "c"):
+            mqtt.publish(topic, "1")
+        self.assertEqual(mqtt.dropped, 1)
+        self.assertEqual(paho.sent, [])
+
+        mqtt.add_command_handler("s7/dev/attr/set", lambda payload: None)
+        mqtt._on_connect(paho, None, {}, 0)
+        self.assertEqual([t for t, _, _, _ in paho.sent], ["b", "c"])
+        self.assertIn(("s7/+/+/set", 0), paho.subscribed)
+
+    def test_reconnect_keeps_inflight_with_qos1(self):
+        paho = FakePaho()
+        mqtt = MqttClient({"max_inflight": 1, "qos": 1}, client=paho)
+        mqtt.publish("a", "1")
+        mqtt.publish("b", "1")
+        mqtt._on_disconnect(paho, None, 0)
+        mqtt._on_connect(paho, None, {}, 0)
+        # paho ritrasmette "a" con lo stesso mid: "b" aspetta il suo ack
+        self.assertEqual(mqtt.inflight, 1)
+        self.assertEqual([t for t, _, _, _ in paho.sent], ["a"])
+
+        mqtt._on_publish(paho, None, 1)
+        mqtt._on_publish(paho, None, 1)  # ack duplicato, ignorato
+        self.assertEqual([t for t, _, _, _ in paho.sent], ["a", "b"])
+        self.assertEqual(mqtt.inflight, 1)
+        self.assertEqual(mqtt._acked_early, set())
+
+    def test_confirmed_messages_are_kept_and_reported(self):
+        paho = FakePaho()
+        mqtt = MqttClient({"max_queue": 2, "qos": 1}, client=paho)
+        mqtt._on_disconnect(paho, None, 0)
+        confirmed = []
+        mqtt.publish("ha/config", "{}", retain=True, on_sent=lambda: confirmed.append("ha/config"))
+        for topic in ("a", "b", "c"):
+            mqtt.publish(topic, "1")
+        self.assertEqual(list(mqtt._queue), ["ha/config", "c"])
+        self.assertEqual(mqtt.dropped, 2)
+
+        mqtt._on_connect(paho, None, {}, 0)
+        self.assertEqual(confirmed, [])  # consegnato a paho ma non ancora confermato
+        # Riconnessione prima dell'ack: paho ritrasmette con lo stesso mid
+        mqtt._on_disconnect(paho, None, 0)
+        mqtt._on_connect(paho, None, {}, 0)
+        mqtt._on_publish(paho, None, 1)
+        self.assertEqual(confirmed, ["ha/config"])
+
+
+class HandleMessageTest(unittest.TestCase):
+    def test_failing_handler_is_logged(self):
+        mqtt = MqttClient({}, client=None)
+        mqtt.add_command_handler("s7/x/state/set", lambda payload: 1 / 0)
+        with self.assertLogs(level="ERROR") as cm:
+            mqtt.handle_message("s7/x/state/set", "1")
+        self.assertIn("s7/x/state/set", cm.output[0])
+
+
+class LockingPaho(FakePaho):
+    """Takes a mutex in publish() and around on_publish, like paho with qos >= 1."""
+
+    def __init__(self):
+        super().__init__()
+        self.mutex = threading.RLock()  # come _out_message_mutex di paho
+        self.on_publish = None
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        with self.mutex:
+            time.sleep(0)  # cede il GIL tenendo il mutex, come l'I/O di paho
+            return super().publish(topic, payload, qos, retain)
+
+    def ack(self, mid):
+        with self.mutex:
+            time.sleep(0)
+            self.on_publish(self, None, mid)
+
+
+class ConcurrentPublishTest(unittest.TestCase):
+    def test_publish_and_acks_from_two_threads(self):
+        paho = LockingPaho()
+        mqtt = MqttClient({"qos": 1, "max_inflight": 5}, client=paho)
+        paho.on_publish = mqtt._on_publish
+        count = 500
+        done = threading.Event()
+
+        def publisher():
+            for i in range(count):
+                mqtt.publish(f"t/{i}", "1")
+
+        def acker():
+            acked = 0
+            while acked < count and not done.is_set():
+                if acked < paho._mid:
+                    acked += 1
+                    paho.ack(acked)
+                else:
+                    time.sleep(0)
+
+        threads = [threading.Thread(target=publisher, daemon=True), threading.Thread(target=acker, daemon=True)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+        done.set()
+        self.assertFalse(any(t.is_alive() for t in threads), "deadlock tra publish e on_publish")
+        self.assertEqual(mqtt.sent, count)
+        self.assertEqual(mqtt.queue_depth, 0)
+        self.assertEqual(mqtt.inflight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
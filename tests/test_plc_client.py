@@ -1,22 +1,70 @@
+import ctypes
 import struct
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 import pys7tomqtt.plc_client as pc
 pc.snap7 = None
 
 from pys7tomqtt.plc_client import PlcClient
+from pys7tomqtt.simulator import S7Simulator
 
 
 class FakeSnap7Client:
+    """Serve reads from per-DB byte images built from ``(db, start, size)`` keys."""
+
     def __init__(self, data_map, raise_on=None):
-        self.data_map = data_map
         self.raise_on = raise_on
+        self.calls = []
+        self.dbs = {}
+        for (dbnumber, start, size), data in data_map.items():
+            image = self.dbs.setdefault(dbnumber, bytearray(64))
+            image[start:start + size] = data
 
     def read_area(self, area, dbnumber, start, size):
-        key = (dbnumber, start, size)
-        if self.raise_on == key:
-            raise RuntimeError("read error")
-        return self.data_map[key]
+        self.calls.append((dbnumber, start, size))
+        if self.raise_on is not None:
+            db, s, n = self.raise_on
+            if db == dbnumber and s < start + size and start < s + n:
+                raise RuntimeError("read error")
+        return bytes(self.dbs[dbnumber][start:start + size])
+
+
+class FakeSnap7MultiClient(FakeSnap7Client):
+    """Adds ``read_multi_vars`` on top of the byte images of :class:`FakeSnap7Client`."""
+
+    def __init__(self, data_map, pdu=240):
+        super().__init__(data_map)
+        self.pdu = pdu
+        self.multi_calls = []
+        self.write_calls = []
+        self.multi_write_calls = []
+
+    def get_pdu_length(self):
+        return self.pdu
+
+    def read_multi_vars(self, items):
+        self.multi_calls.append([(i.DBNumber, i.Start, i.Amount) for i in items])
+        for item in items:
+            if item.DBNumber not in self.dbs:
+                item.Result = 1
+                continue
+            data = self.dbs[item.DBNumber][item.Start:item.Start + item.Amount]
+            ctypes.memmove(item.pData, bytes(data), item.Amount)
+            item.Result = 0
+        return 0, items
+
+    def write_area(self, area, dbnumber, start, data):
+        self.write_calls.append((dbnumber, start, bytes(data)))
+        self.dbs[dbnumber][start:start + len(data)] = data
+
+    def write_multi_vars(self, items):
+        self.multi_write_calls.append([(i.DBNumber, i.Start, bytes(i.pData[:i.Amount])) for i in items])
+        for item in items:
+            self.dbs[item.DBNumber][item.Start:item.Start + item.Amount] = bytes(item.pData[:item.Amount])
+            item.Result = 0
+        return 0
 
 
 class FakeSnap7WriteClient:
@@ -44,6 +92,30 @@ class PlcClientReadAllTest(unittest.TestCase):
         self.assertEqual(result["int/topic"], 123)
         self.assertAlmostEqual(result["float/topic"], 3.14, places=5)
 
+    def test_read_all_coalesces_nearby_items(self):
+        data_map = {
+            (1, 0, 1): bytes([0b00000110]),
+            (1, 10, 2): (-5).to_bytes(2, "big", signed=True),
+            (2, 0, 1): bytes([9]),
+        }
+        client = FakeSnap7Client(data_map)
+        plc = PlcClient({"read_gap": 10}, client=client)
+        plc.add_item("a", "DB1.DBX0.1")
+        plc.add_item("b", "DB1.DBX0.3")
+        plc.add_item("c", "DB1.DBW10")
+        plc.add_item("d", "DB2.DBB0")
+        result = plc.read_all()
+        self.assertEqual(client.calls, [(1, 0, 12), (2, 0, 1)])
+        self.assertEqual(result, {"a": True, "b": False, "c": -5, "d": 9})
+
+    def test_read_gap_splits_distant_items(self):
+        client = FakeSnap7Client({(1, 0, 1): bytes([1])})
+        plc = PlcClient({"read_gap": 4}, client=client)
+        plc.add_item("a", "DB1.DBB0")
+        plc.add_item("b", "DB1.DBB20")
+        plc.read_all()
+        self.assertEqual(client.calls, [(1, 0, 1), (1, 20, 1)])
+
     def test_connection_error_logged_and_skipped(self):
         client = FakeSnap7Client({}, raise_on=(1, 0, 1))
         plc = PlcClient({}, client=client)
@@ -54,11 +126,100 @@ class PlcClientReadAllTest(unittest.TestCase):
         self.assertTrue(any("Failed to read address" in msg for msg in cm.output))
 
 
+class PlcClientPollGroupTest(unittest.TestCase):
+    def test_groups_have_separate_plans(self):
+        data_map = {(1, 0, 1): bytes([1]), (1, 40, 4): struct.pack(">f", 21.5)}
+        client = FakeSnap7Client(data_map)
+        plc = PlcClient({}, client=client)
+        plc.add_item("fast", "DB1.DBX0.0", 50)
+        plc.add_item("slow", "DB1.DBR40", 60000)
+        plc.add_item("default", "DB1.DBB1")
+        self.assertEqual(plc.poll_groups(), [None, 50, 60000])
+        self.assertEqual(plc.read_group(50), {"fast": True})
+        self.assertEqual(client.calls, [(1, 0, 1)])
+        self.assertEqual(plc.read_group(None), {"default": 0})
+        self.assertAlmostEqual(plc.read_group(60000)["slow"], 21.5)
+        self.assertEqual(set(plc.read_all()), {"fast", "slow", "default"})
+
+
+class PlcClientChangeDetectionTest(unittest.TestCase):
+    def test_only_changed_items_are_returned(self):
+        client = FakeSnap7Client({(1, 0, 1): bytes([0b01]), (1, 2, 2): (7).to_bytes(2, "big")})
+        plc = PlcClient({}, client=client)
+        plc.add_item("bit0", "DB1.DBX0.0")
+        plc.add_item("bit1", "DB1.DBX0.1")
+        plc.add_item("word", "DB1.DBW2")
+        self.assertEqual(plc.read_all(changes_only=True), {"bit0": True, "bit1": False, "word": 7})
+        self.assertEqual(plc.read_all(changes_only=True), {})
+        client.dbs[1][0] = 0b10
+        self.assertEqual(plc.read_all(changes_only=True), {"bit0": False, "bit1": True})
+        client.dbs[1][3] = 8
+        self.assertEqual(plc.read_all(changes_only=True), {"word": 8})
+
+    def test_untracked_items_always_returned(self):
+        client = FakeSnap7Client({(1, 0, 1): bytes([3])})
+        plc = PlcClient({}, client=client)
+        plc.add_item("tracked", "DB1.DBB0")
+        plc.add_item("periodic", "DB1.DBB1", track_changes=False)
+        plc.read_all(changes_only=True)
+        self.assertEqual(plc.read_all(changes_only=True), {"periodic": 0})
+
+
+class PlcClientMultiVarReadTest(unittest.TestCase):
+    def test_scattered_dbs_read_in_one_request(self):
+        data_map = {(db, 2, 2): (db * 10).to_bytes(2, "big", signed=True) for db in range(1, 11)}
+        client = FakeSnap7MultiClient(data_map)
+        plc = PlcClient({}, client=client)
+        for db in range(1, 11):
+            plc.add_item(f"t{db}", f"DB{db}.DBW2")
+        result = plc.read_all()
+        self.assertEqual(len(client.multi_calls), 1)
+        self.assertEqual(client.calls, [])
+        self.assertEqual(result, {f"t{db}": db * 10 for db in range(1, 11)})
+
+    def test_large_block_split_over_requests(self):
+        data_map = {(1, 0, 1): bytes([5]), (1, 60, 1): bytes([6])}
+        client = FakeSnap7MultiClient(data_map, pdu=40)
+        plc = PlcClient({"read_gap": 64}, client=client)
+        plc.add_item("a", "DB1.DBB0")
+        plc.add_item("b", "DB1.DBB60")
+        result = plc.read_all()
+        self.assertGreater(len(client.multi_calls), 1)
+        self.assertEqual(result, {"a": 5, "b": 6})
+
+    def test_failed_item_skips_block(self):
+        client = FakeSnap7MultiClient({(1, 0, 1): bytes([1])})
+        plc = PlcClient({}, client=client)
+        plc.add_item("ok", "DB1.DBB0")
+        plc.add_item("missing", "DB9.DBB0")
+        with self.assertLogs(level="ERROR"):
+            result = plc.read_all()
+        self.assertEqual(result, {"ok": 1})
+
+
+class PlcClientConnectionPoolTest(unittest.TestCase):
+    def test_reads_spread_over_pool_and_writes_on_dedicated_connection(self):
+        data_map = {(db, 0, 1): bytes([db]) for db in range(1, 5)}
+        clients = [FakeSnap7Client(data_map) for _ in range(3)]
+        plc = PlcClient({"read_gap": 0, "write_snapshot_age": 0}, clients=clients)
+        for db in range(1, 5):
+            plc.add_item(f"t{db}", f"DB{db}.DBX0.0")
+        self.assertEqual(plc.read_all(), {"t1": True, "t2": False, "t3": True, "t4": False})
+        self.assertEqual(clients[0].calls, [])
+        self.assertEqual(len(clients[1].calls), 2)
+        self.assertEqual(len(clients[2].calls), 2)
+
+        clients[0].write_area = lambda area, db, start, data: clients[0].calls.append(("w", db, start))
+        plc.write_item("t2", True)
+        self.assertEqual(clients[0].calls, [(2, 0, 1), ("w", 2, 0)])
+        self.assertEqual(len(clients[1].calls) + len(clients[2].calls), 4)
+
+
 class PlcClientWriteItemTest(unittest.TestCase):
     def test_write_item_translates_and_encodes(self):
         import  pys7tomqtt.plc_client as pc
 
-        expected_area = pc.snap7.type.Areas.DB if pc.snap7 is not None else 0
+        expected_area = pc.snap7.type.Areas.DB if pc.snap7 is not None else pc.S7_AREA_DB
         cases = [
             ("DB1.DBX0.0", True, 0, bytes([1])),
             ("DB1.DBB1", 7, 1, bytes([7])),
@@ -73,6 +234,39 @@ class PlcClientWriteItemTest(unittest.TestCase):
                 plc.write_item("topic", value)
                 self.assertEqual(client.calls[0], (expected_area, 1, start, data))
 
+    def test_bit_writes_to_same_byte_are_merged(self):
+        client = FakeSnap7MultiClient({(1, 0, 1): bytes([0b10000001])})
+        plc = PlcClient({}, client=client)
+        for bit in range(1, 7):
+            plc.add_item(f"bit{bit}", f"DB1.DBX0.{bit}")
+        with plc.batch_writes():
+            for bit in range(1, 7):
+                plc.write_item(f"bit{bit}", True)
+            plc.write_item("bit3", False)
+        self.assertEqual(len(client.multi_calls), 1)  # base byte read once
+        self.assertEqual(client.write_calls, [(1, 0, bytes([0b11110111]))])
+
+    def test_bit_write_uses_fresh_poll_snapshot(self):
+        client = FakeSnap7MultiClient({(1, 0, 1): bytes([0b00000100])})
+        plc = PlcClient({"write_snapshot_age": 60000}, client=client)
+        plc.add_item("bit", "DB1.DBX0.0")
+        plc.read_all()
+        client.multi_calls.clear()
+        plc.write_item("bit", True)
+        self.assertEqual(client.multi_calls, [])
+        self.assertEqual(client.write_calls, [(1, 0, bytes([0b00000101]))])
+
+    def test_batched_writes_use_write_multi_vars(self):
+        client = FakeSnap7MultiClient({(1, 0, 1): bytes([0]), (2, 0, 1): bytes([0])})
+        plc = PlcClient({}, client=client)
+        plc.add_item("a", "DB1.DBW0")
+        plc.add_item("b", "DB2.DBB4")
+        with plc.batch_writes():
+            plc.write_item("a", -2)
+            plc.write_item("b", 9)
+        self.assertEqual(client.write_calls, [])
+        self.assertEqual(client.multi_write_calls, [[(1, 0, b"\xff\xfe"), (2, 4, b"\x09")]])
+
     def test_write_item_stores_when_no_client(self):
         plc = PlcClient({}, client=None)
         plc.add_item("topic", "DB1.DBW0")
@@ -80,6 +274,118 @@ class PlcClientWriteItemTest(unittest.TestCase):
         self.assertEqual(plc.read_all()["topic"], 42)
 
 
+class PlcClientCommandQueueTest(unittest.TestCase):
+    def test_commands_coalesce_and_run_before_the_next_read(self):
+        client = FakeSnap7MultiClient({(1, 0, 4): bytes(4)})
+        plc = PlcClient({}, client=client)
+        plc.add_item("a", "DB1.DBW0")
+        plc.add_item("b", "DB1.DBB2")
+        plc.submit_write("a", 1)
+        plc.submit_write("b", 9)
+        plc.submit_write("a", 5)
+        self.assertEqual(client.write_calls, [])
+        self.assertEqual(plc.commands_coalesced, 1)
+
+        values = plc.read_all()
+        self.assertEqual(client.write_calls, [(1, 0, b"\x00\x05\x09")])
+        self.assertEqual((values["a"], values["b"]), (5, 9))
+
+    def test_commands_submitted_to_io_executor_once(self):
+        submitted = []
+
+        class Executor:
+            def submit(self, fn):
+                submitted.append(fn)
+
+        class Loop:
+            def call_soon_threadsafe(self, fn, *args):
+                fn(*args)
+
+        plc = PlcClient({}, client=None)
+        plc.add_item("a", "DB1.DBW0")
+        received = []
+        plc.bind("a", received.append)
+        plc.set_io_executor(Executor(), Loop())
+        plc.submit_write("a", 1)
+        plc.submit_write("a", 2)
+        self.assertEqual(len(submitted), 1)
+        submitted[0]()
+        self.assertEqual(received, [2])
+
+    def test_dedicated_write_connection_does_not_wait_for_poll(self):
+        writer, reader = S7Simulator({1: 4}), S7Simulator({1: 4}, latency=0.5)
+        plc = PlcClient({"multi_read": False}, clients=[writer, reader])
+        plc.add_item("a", "DB1.DBB0")
+        poll = ThreadPoolExecutor(max_workers=1)
+        plc.set_io_executor(poll)
+        running = poll.submit(plc.read_all)
+        time.sleep(0.05)  # poll in corso sulla connessione di lettura
+        plc.submit_write("a", 7)
+        deadline = time.monotonic() + 0.3
+        while writer.dbs[1][0] != 7 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(writer.dbs[1][0], 7)
+        self.assertFalse(running.done())
+        running.result()
+        poll.shutdown()
+
+    def test_write_reads_back_only_the_state_address(self):
+        client = FakeSnap7MultiClient({(1, 0, 1): bytes([0b0001])})
+        plc = PlcClient({"write_snapshot_age": 0}, client=client)
+        plc.add_item("state", "DB1.DBX0.0")
+        plc.add_item("other", "DB1.DBW40")
+        plc.set_write_address("state", "DB1.DBX0.2")
+        client.dbs[1][0] = 0b0100  # il PLC ha gia' spento l'uscita
+        plc.submit_write("state", True)
+        client.multi_calls.clear()
+        self.assertEqual(plc.process_commands(), {"state": False})
+        self.assertEqual(client.write_calls, [(1, 0, bytes([0b0100]))])
+        # lettura del byte base per il bit, poi rilettura del solo DBX0.0
+        self.assertEqual(client.multi_calls, [[(1, 0, 1)], [(1, 0, 1)]])
+
+    def test_read_back_does_not_overwrite_poll_request_gauge(self):
+        client = FakeSnap7MultiClient({(1, 0, 4): bytes(4), (2, 0, 4): bytes(4)}, pdu=240)
+        plc = PlcClient({"multi_read": False, "write_snapshot_age": 0}, client=client)
+        plc.add_item("a", "DB1.DBX0.0")
+        plc.add_item("b", "DB2.DBB0")
+        plc.read_all()
+        polled = plc.last_read_requests
+        self.assertEqual(polled, 2)
+        total = plc.read_requests
+        plc.submit_write("a", True)
+        plc.process_commands()  # lettura del byte base e rilettura
+        self.assertGreater(plc.read_requests, total)
+        self.assertEqual(plc.last_read_requests, polled)
+
+    def test_invalid_write_address_falls_back_to_read_address(self):
+        client = FakeSnap7MultiClient({(1, 0, 2): bytes(2)})
+        plc = PlcClient({}, client=client)
+        plc.add_item("state", "DB1.DBB1")
+        with self.assertLogs(level="ERROR") as cm:
+            plc.set_write_address("state", "DB1.FOO")
+        self.assertIn("DB1.FOO", cm.output[0])
+        plc.write_item("state", 5)
+        self.assertEqual(client.write_calls, [(1, 1, bytes([5]))])
+
+
+
+class PlcClientDispatchTest(unittest.TestCase):
+    def test_failing_handler_does_not_stop_dispatch(self):
+        plc = PlcClient({}, client=None)
+        received = []
+
+        def broken(value):
+            raise TypeError("boom")
+
+        plc.bind("a", broken)
+        plc.bind("b", received.append)
+        plc.defer(lambda: received.append("deferred"))
+        with self.assertLogs(level="ERROR") as cm:
+            plc.dispatch({"a": 1, "b": 2})
+        self.assertIn("Handler for a failed", cm.output[0])
+        self.assertEqual(received, [2, "deferred"])
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,64 @@
+import unittest
+
+from pys7tomqtt.plc_client import ParsedAddress
+from pys7tomqtt.read_plan import ReadBlock, build_read_plan, pack_multi_reads
+
+
+class BuildReadPlanTest(unittest.TestCase):
+    def test_merges_overlapping_and_nearby_items(self):
+        items = {
+            "a": ParsedAddress("DB1.DBX4.0", 1, "X", 4, 0),
+            "b": ParsedAddress("DB1.DBB4", 1, "B", 4, 0),
+            "c": ParsedAddress("DB1.DBR6", 1, "R", 6, 0),
+            "d": ParsedAddress("DB3.DBW0", 3, "W", 0, 0),
+        }
+        plan = build_read_plan(items, max_gap=0)
+        self.assertEqual([(b.db, b.start, b.size) for b in plan], [(1, 4, 1), (1, 6, 4), (3, 0, 2)])
+        plan = build_read_plan(items, max_gap=1)
+        self.assertEqual([(b.db, b.start, b.size) for b in plan], [(1, 4, 6), (3, 0, 2)])
+        self.assertEqual([t for t, _ in plan[0].items], ["a", "b", "c"])
+
+    def test_process_areas_read_as_one_snapshot(self):
+        items = {
+            "db": ParsedAddress("DB1.DBB0", 1, "B", 0, 0),
+            "m0": ParsedAddress("M0.1", 0, "X", 0, 1, 0, 0x83),
+            "m": ParsedAddress("MB100", 0, "B", 100, 0, 0, 0x83),
+            "i": ParsedAddress("IW4", 0, "W", 4, 0, 0, 0x81),
+            "q": ParsedAddress("Q0.0", 0, "X", 0, 0, 0, 0x82),
+        }
+        plan = build_read_plan(items, max_gap=0)
+        self.assertEqual(
+            [(b.area, b.start, b.size) for b in plan], [(0x84, 0, 1), (0x81, 4, 2), (0x82, 0, 1), (0x83, 0, 101)]
+        )
+        plan = build_read_plan(items, max_gap=0, area_gap=16)
+        self.assertEqual([(b.area, b.start, b.size) for b in plan][-2:], [(0x83, 0, 1), (0x83, 100, 1)])
+
+
+class PackMultiReadsTest(unittest.TestCase):
+    def test_packs_small_blocks_in_one_request(self):
+        blocks = [ReadBlock(db, 0, 4) for db in range(1, 11)]
+        batches = pack_multi_reads(blocks, pdu=240)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 10)
+
+    def test_respects_item_limit(self):
+        blocks = [ReadBlock(db, 0, 1) for db in range(30)]
+        batches = pack_multi_reads(blocks, pdu=960, max_vars=20)
+        self.assertEqual([len(b) for b in batches], [20, 10])
+
+    def test_splits_oversized_block_within_pdu(self):
+        pdu = 240
+        batches = pack_multi_reads([ReadBlock(1, 0, 1000)], pdu=pdu)
+        chunks = [c for batch in batches for c in batch]
+        self.assertEqual(sum(c.size for c in chunks), 1000)
+        self.assertEqual(chunks[0].start, 0)
+        for batch in batches:
+            response = 14 + sum(4 + c.size + (c.size & 1) for c in batch)
+            self.assertLessEqual(response, pdu)
+            self.assertLessEqual(12 + 12 * len(batch), pdu)
+        for prev, nxt in zip(chunks, chunks[1:]):
+            self.assertEqual(prev.start + prev.size, nxt.start)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pys7tomqtt import tracing
+from pys7tomqtt.plc_client import PlcClient
+from pys7tomqtt.scheduler import PollScheduler
+from pys7tomqtt.simulator import S7Simulator
+
+
+class PollSchedulerTest(unittest.TestCase):
+    def run_scheduler(self, read_fn, period, cycles, **kwargs):
+        executor = ThreadPoolExecutor(max_workers=1)
+        dispatched = []
+
+        def dispatch(result):
+            dispatched.append(result)
+            if len(dispatched) >= cycles:
+                scheduler.stop()
+
+        scheduler = PollScheduler(executor, read_fn, dispatch, period, **kwargs)
+        started = time.monotonic()
+        asyncio.run(scheduler.run())
+        executor.shutdown()
+        return scheduler, dispatched, time.monotonic() - started
+
+    def test_period_does_not_drift_with_read_time(self):
+        def read():
+            time.sleep(0.01)
+            return 1
+
+        scheduler, dispatched, elapsed = self.run_scheduler(read, 0.03, 5)
+        self.assertEqual(len(dispatched), 5)
+        self.assertEqual(scheduler.overruns, 0)
+        # 4 periodi completi + l'ultima lettura, non 5 * (lettura + periodo)
+        self.assertLess(elapsed, 4 * 0.03 + 0.04)
+
+    def test_overruns_are_skipped_and_counted(self):
+        def read():
+            time.sleep(0.05)
+            return 1
+
+        scheduler, dispatched, _ = self.run_scheduler(read, 0.02, 3)
+        self.assertEqual(len(dispatched), 3)
+        self.assertGreaterEqual(scheduler.overruns, 3)
+
+    def test_read_runs_off_the_event_loop_thread(self):
+        loop_thread = threading.get_ident()
+        _, dispatched, _ = self.run_scheduler(threading.get_ident, 0.01, 1)
+        self.assertNotEqual(dispatched[0], loop_thread)
+
+
+class CycleTraceTest(unittest.TestCase):
+    def test_slow_cycle_logs_stage_breakdown(self):
+        plc = PlcClient({}, client=S7Simulator({1: 64}, latency=0.02))
+        plc.add_item("a", "DB1.DBW0")
+        executor = ThreadPoolExecutor(max_workers=1)
+        scheduler = PollScheduler(
+            executor, plc.read_all, lambda result: scheduler.stop(), 1, name="t", slow_threshold=0.01
+        )
+        with self.assertLogs(level="WARNING") as logs:
+            asyncio.run(scheduler.run())
+        executor.shutdown()
+        self.assertEqual(scheduler.slow_cycles, 1)
+        self.assertEqual(set(scheduler.last_trace.spans), {"io", "plan", "read", "decode", "dispatch"})
+        self.assertEqual(len(scheduler.last_trace.blocks), 1)
+        self.assertIn("read=", logs.output[0])
+
+    def test_profile_capture_writes_files_after_n_cycles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            capture = tracing.ProfileCapture(directory)
+            capture.start(2)
+            scheduler, _, _ = PollSchedulerTest().run_scheduler(lambda: sum(range(100)), 0.01, 3, profiler=capture)
+            self.assertFalse(capture.active)
+            self.assertEqual(sorted(os.path.splitext(f)[1] for f in capture.last_files), [".pstats", ".tracemalloc"])
+            self.assertTrue(all(os.path.exists(f) for f in capture.last_files))
+
+    def test_profile_capture_overlapping_threads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            capture = tracing.ProfileCapture(directory)
+            capture.start(1)
+            barrier = threading.Barrier(2)
+
+            def work(n):
+                barrier.wait(timeout=5)  # le due chiamate profilate si sovrappongono
+                return sum(range(n))
+
+            with ThreadPoolExecutor(2) as pool:
+                results = list(pool.map(lambda n: capture.run(work, n), [10, 20]))
+            capture.cycle_done()
+            self.assertEqual(results, [45, 190])
+            self.assertFalse(capture.active)
+            self.assertTrue(any(f.endswith(".pstats") for f in capture.last_files))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -27,6 +27,14 @@ class SensorDeviceTest(unittest.TestCase):
         self.assertIsNotNone(attr)
         self.assertEqual(attr.type, "X")
 
+    def test_poll_interval_from_device_and_attribute(self):
+        plc = DummyPlc()
+        mqtt = DummyMqtt()
+        SensorDevice(plc, mqtt, {"type": "sensor", "name": "a", "poll_interval": 60000, "state": "DB1.DBR0"})
+        SensorDevice(plc, mqtt, {"type": "sensor", "name": "b", "poll_interval": 60000,
+                                 "state": {"plc": "DB1.DBX4.0", "poll_interval": 50}})
+        self.assertEqual(plc.poll_groups(), [50, 60000])
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
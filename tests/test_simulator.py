@@ -0,0 +1,112 @@
+import ctypes
+import time
+import unittest
+
+import pys7tomqtt.plc_client as pc
+pc.snap7 = None
+
+from pys7tomqtt.benchmarks.poll_cycle import run_benchmark
+from pys7tomqtt.plc_client import PlcClient, s7_data_item_type
+from pys7tomqtt.simulator import S7Simulator
+
+
+class S7SimulatorTest(unittest.TestCase):
+    def test_plc_client_round_trip(self):
+        sim = S7Simulator({1: 16, 2: 8})
+        plc = PlcClient({}, client=sim)
+        plc.add_item("bit", "DB1.DBX0.3")
+        plc.add_item("real", "DB1.DBR4")
+        plc.add_item("word", "DB2.DBW0")
+        with plc.batch_writes():
+            plc.write_item("bit", True)
+            plc.write_item("real", 1.5)
+            plc.write_item("word", -3)
+        self.assertEqual(plc.read_all(), {"bit": True, "real": 1.5, "word": -3})
+        self.assertEqual(sim.dbs[1][0], 0b1000)
+
+    def test_array_and_string_tags_round_trip(self):
+        sim = S7Simulator({5: 2100})
+        plc = PlcClient({}, client=sim)
+        plc.add_item("trend", "DB5.DBR0[500]")
+        plc.add_item("flags", "DB5.DBX2000.4[6]")
+        plc.add_item("name", "DB5.DBSTRING2002.10")
+        plc.add_item("stamp", "DB5.DBDTL2014")
+        trend = [float(i) for i in range(500)]
+        with plc.batch_writes():
+            plc.write_item("trend", trend)
+            plc.write_item("flags", [True, False, True, True, False, True])
+            plc.write_item("name", "pump 1")
+            plc.write_item("stamp", "2024-05-01T12:30:00")
+        values = plc.read_all()
+        self.assertEqual(values["trend"], tuple(trend))
+        self.assertEqual(values["flags"], (True, False, True, True, False, True))
+        self.assertEqual(values["name"], "pump 1")
+        self.assertEqual(values["stamp"], "2024-05-01T12:30:00.000000")
+        self.assertEqual(sim.dbs[5][2000:2002], bytes([0b11010000, 0b00000010]))
+
+    def test_process_areas_bulk_snapshot_and_writes(self):
+        sim = S7Simulator({})
+        plc = PlcClient({}, client=sim)
+        for topic, address in [("start", "I0.0"), ("speed", "IW4"), ("lamp", "Q0.3"), ("flag", "M10.1"), ("count", "MW100")]:
+            plc.add_item(topic, address)
+        sim.areas[0x81][0] = 0b1
+        sim.areas[0x81][4:6] = (1500).to_bytes(2, "big")
+        sim.areas[0x82][0] = 0b10000001
+        self.assertEqual(plc.read_all(), {"start": True, "speed": 1500, "lamp": False, "flag": False, "count": 0})
+        self.assertEqual(sim.requests, 1)  # un solo multi-read per DB e aree
+
+        with plc.batch_writes():
+            plc.write_item("lamp", True)
+            plc.write_item("count", -2)
+        self.assertEqual(sim.areas[0x82][0], 0b10001001)  # bit vicini preservati
+        self.assertEqual(bytes(sim.areas[0x83][100:102]), (-2).to_bytes(2, "big", signed=True))
+
+    def test_multi_var_request_over_pdu_is_rejected(self):
+        sim = S7Simulator({1: 512}, pdu=240)
+        items = (s7_data_item_type() * 1)()
+        buf = (ctypes.c_uint8 * 400)()
+        items[0].Area, items[0].DBNumber, items[0].Start, items[0].Amount = 0x84, 1, 0, 400
+        items[0].pData = ctypes.cast(buf, ctypes.POINTER(ctypes.c_uint8))
+        with self.assertRaises(RuntimeError):
+            sim.read_multi_vars(items)
+
+    def test_simulate_config_and_latency(self):
+        plc = PlcClient({"simulate": True, "simulator": {"latency_ms": 1}})
+        plc.add_item("a", "DB7.DBB0")
+        plc.add_item("b", "DB8.DBB0")
+        plc.read_all()
+        self.assertEqual(plc._client.requests, 1)
+
+    def test_reconnect_with_backoff_after_plc_drop(self):
+        sim = S7Simulator({1: 4})
+        plc = PlcClient({"reconnect_min": 0.05, "reconnect_max": 0.2}, client=sim)
+        plc.add_item("a", "DB1.DBB0")
+        states = []
+        plc.add_connection_listener(states.append)
+        self.assertEqual(plc.read_all(changes_only=True), {"a": 0})
+
+        sim.online = False
+        with self.assertLogs(level="WARNING") as cm:
+            self.assertEqual(plc.read_all(), {})
+        self.assertFalse(any("Traceback" in line for line in cm.output))
+        self.assertEqual(states, [False])
+        requests = sim.requests
+        self.assertEqual(plc.read_all(), {})  # backoff: nessuna richiesta
+        self.assertEqual(sim.requests, requests)
+
+        sim.online = True
+        time.sleep(0.06)
+        self.assertEqual(plc.read_all(changes_only=True), {"a": 0})  # ripubblicato
+        self.assertEqual(states, [False, True])
+        self.assertEqual(plc.reconnects, 1)
+        self.assertGreater(plc.last_recovery, 0)
+
+    def test_benchmark_smoke(self):
+        row = run_benchmark(50, cycles=2)
+        self.assertEqual(row["tags"], 50)
+        self.assertGreater(row["round_trips"], 0)
+        self.assertGreater(row["bytes_per_tag"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
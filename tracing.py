@@ -0,0 +1,196 @@
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+_local = threading.local()
+
+# Da Python 3.12 cProfile usa sys.monitoring: un solo profiler attivo per
+# processo, che pero' vede tutti i thread
+_SHARED_PROFILER = sys.version_info >= (3, 12)
+
+
+class CycleTrace:
+    """Per-stage timings of one poll cycle.
+
+    Stages are accumulated by name (``plan``, ``read``, ``decode``,
+    ``dispatch``, ``publish``...); ``blocks`` lists the duration of every
+    single PLC request.  Stages may nest: ``publish`` is part of
+    ``dispatch``.
+    """
+
+    __slots__ = ("name", "spans", "blocks")
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.spans: Dict[str, float] = {}
+        self.blocks: List[Tuple[str, float]] = []
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def block(self, label: str, seconds: float) -> None:
+        self.blocks.append((label, seconds))  # append atomico: chiamato dai thread del pool
+
+    def format(self) -> str:
+        parts = [f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.spans.items()]
+        if self.blocks:
+            slowest = sorted(self.blocks, key=lambda b: b[1], reverse=True)[:5]
+            detail = ", ".join(f"{label} {seconds * 1000:.1f}ms" for label, seconds in slowest)
+            parts.append(f"requests={len(self.blocks)} [{detail}]")
+        return " ".join(parts)
+
+
+class _Span:
+    __slots__ = ("trace", "stage", "started")
+
+    def __init__(self, trace: CycleTrace, stage: str):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def activate(trace: CycleTrace | None) -> None:
+    """Make ``trace`` the trace of the calling thread (``None`` to clear it)."""
+
+    _local.trace = trace
+
+
+def current() -> CycleTrace | None:
+    return getattr(_local, "trace", None)
+
+
+def span(stage: str):
+    """Context manager timing ``stage`` in the active trace; no-op without one."""
+
+    trace = getattr(_local, "trace", None)
+    return _Span(trace, stage) if trace is not None else _NULL_SPAN
+
+
+class ProfileCapture:
+    """cProfile/tracemalloc capture of the next ``cycles`` poll cycles.
+
+    :meth:`start` may be called from any thread (signal handler, MQTT
+    callback).  The poll schedulers run their read and dispatch through
+    :meth:`run` and call :meth:`cycle_done` at the end of every cycle.
+    From Python 3.12 a single profiler is enabled for the whole capture
+    window and covers every thread; older versions use one profiler per
+    thread around each :meth:`run`.  A profiler that cannot be enabled never
+    makes the profiled call fail.  When enough cycles have
+    been captured the merged profile is written to ``<directory>/
+    profile-<timestamp>.pstats`` and, if tracemalloc was started by the
+    capture, the allocation snapshot to ``.tracemalloc``.
+    """
+
+    def __init__(self, directory: str = ".", default_cycles: int = 50):
+        self.directory = directory
+        self.default_cycles = int(default_cycles)
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._profilers: Dict[int, cProfile.Profile] = {}
+        self._tracemalloc = False
+        self.last_files: List[str] = []
+
+    @property
+    def active(self) -> bool:
+        return self._remaining > 0
+
+    def start(self, cycles: int | None = None) -> None:
+        cycles = int(cycles or self.default_cycles)
+        with self._lock:
+            if self._remaining:
+                logging.info("Profiling already running, %d cycle(s) left", self._remaining)
+                return
+            self._profilers = {}
+            if _SHARED_PROFILER:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError as exc:  # un altro profiler e' gia' attivo
+                    logging.warning("Cannot start profiling: %s", exc)
+                    return
+                self._profilers[0] = profiler
+            self._tracemalloc = not tracemalloc.is_tracing()
+            if self._tracemalloc:
+                tracemalloc.start()
+            self._remaining = cycles
+        logging.info("Profiling the next %d poll cycle(s)", cycles)
+
+    def run(self, fn: Callable, *args):
+        if not self._remaining or _SHARED_PROFILER:
+            return fn(*args)
+        ident = threading.get_ident()
+        with self._lock:
+            profiler = self._profilers.get(ident)
+            if profiler is None:
+                profiler = self._profilers[ident] = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as exc:
+            logging.debug("Profiling skipped for this call: %s", exc)
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profiler.disable()
+
+    def cycle_done(self) -> None:
+        with self._lock:
+            if not self._remaining:
+                return
+            self._remaining -= 1
+            if self._remaining:
+                return
+            profilers, self._profilers = list(self._profilers.values()), {}
+            stop_tracemalloc, self._tracemalloc = self._tracemalloc, False
+        if _SHARED_PROFILER:
+            for profiler in profilers:
+                profiler.disable()
+        self._write(profilers, stop_tracemalloc)
+
+    def _write(self, profilers: List[cProfile.Profile], stop_tracemalloc: bool) -> None:
+        base = os.path.join(self.directory, time.strftime("profile-%Y%m%d-%H%M%S"))
+        files = []
+        try:
+            if profilers:
+                stats = pstats.Stats(profilers[0])
+                for profiler in profilers[1:]:
+                    stats.add(profiler)
+                stats.dump_stats(base + ".pstats")
+                files.append(base + ".pstats")
+            if stop_tracemalloc:
+                tracemalloc.take_snapshot().dump(base + ".tracemalloc")
+                files.append(base + ".tracemalloc")
+        except OSError as exc:
+            logging.error("Failed to write profile to %s: %s", base, exc)
+        finally:
+            if stop_tracemalloc:
+                tracemalloc.stop()
+        self.last_files = files
+        if files:
+            logging.info("Profile written to %s", ", ".join(files))
@@ -1,40 +1,105 @@
 import re
+from typing import Dict, Tuple
+
+_ADDRESS_RE = re.compile(
+    r"DB(\d+)\.(?:DB)?(X|B|W|DW|DINT|D|I|DI|R|DR|LREAL|LR|STRING|WSTRING|DTL)(\d+)(?:\.(\d+))?(?:\[(\d+)\])?"
+)
+# Ingressi, uscite e merker: I0.0, IB0, QW4, MD8... (senza tipo = bit)
+_AREA_RE = re.compile(
+    r"(I|Q|M)(X|B|W|DINT|D|R|LREAL|LR|STRING|WSTRING|DTL)?(\d+)(?:\.(\d+))?(?:\[(\d+)\])?"
+)
+# Alias normalizzati
+_ALIASES = {"DW": "D", "DI": "I", "DR": "R", "LREAL": "LR"}
+# Lunghezza massima ammessa per le stringhe S7 (254 se non indicata)
+STRING_TYPES = {"STRING": 254, "WSTRING": 16382}
+
+# Codici area S7 (come snap7.type.Areas)
+AREA_INPUTS = 0x81
+AREA_OUTPUTS = 0x82
+AREA_MARKERS = 0x83
+AREA_DB = 0x84
+_AREAS = {"I": AREA_INPUTS, "Q": AREA_OUTPUTS, "M": AREA_MARKERS}
+_AREA_NAMES = {code: name for name, code in _AREAS.items()}
+
+# Indirizzo (stringa del config) -> tupla gia' validata
+_PARSED: Dict[str, Tuple[int, str, int, int, int, int]] = {}
+
+
+def area_name(area: int, db: int) -> str:
+    """Label of a memory area for logs: ``DB5``, ``I``, ``Q`` or ``M``."""
+
+    return _AREA_NAMES.get(area) or f"DB{db}"
+
+
+def parse_address(address: str) -> Tuple[int, str, int, int, int, int]:
+    """Parse an S7 address, memoized per address string.
+
+    Returns a tuple of ``(db_number, data_type, byte_offset, bit_offset,
+    count, area)``.  ``bit_offset`` is zero when not used.  ``count`` is the
+    number of elements of an array tag (``DB5.DBR0[500]``), zero for a
+    scalar; for STRING/WSTRING it is the maximum length in characters.
+    ``area`` is the S7 area code: :data:`AREA_DB` for ``DBn.`` addresses,
+    :data:`AREA_INPUTS`, :data:`AREA_OUTPUTS` or :data:`AREA_MARKERS` (with
+    ``db_number`` zero) for ``I``, ``Q`` and ``M`` addresses such as
+    ``I0.0``, ``QW4`` or ``MB100``.
+
+    Tipi supportati (e alias):
+    X       (bit)                   -> DBX
+    B       (byte)                  -> DBB
+    W/I     (word/int16 signed)     -> DBW / DBI
+    D       (dword uint32)          -> DBD / D BW alias DW
+    R       (real float32)          -> DBR / DR
+    DINT    (int32 signed)          -> DBDINT
+    LR      (lreal float64)         -> DBLR / DBLREAL
+    STRING  (S7 string, latin-1)    -> DBSTRING10.20 (max 20 caratteri)
+    WSTRING (S7 wstring, UTF-16)    -> DBWSTRING10.20
+    DTL     (data e ora, 12 byte)   -> DBDTL0
+    """
+
+    parsed = _PARSED.get(address)
+    if parsed is not None:
+        return parsed
+
+    upper = address.upper()
+    m = _ADDRESS_RE.fullmatch(upper)
+    if m:
+        db, area = int(m.group(1)), AREA_DB
+    else:
+        m = _AREA_RE.fullmatch(upper)
+        # Senza tipo e' un bit: il ".n" e' obbligatorio
+        if not m or (m.group(2) is None and m.group(4) is None):
+            raise ValueError(f"Unsupported address format: {address}")
+        db, area = 0, _AREAS[m.group(1)]
+
+    dtype = _ALIASES.get(m.group(2), m.group(2) or "X")
+    bit = int(m.group(4) or 0)
+    count = int(m.group(5) or 0)
+    if m.group(5) is not None and count < 1:
+        raise ValueError(f"Unsupported address format: {address}")
+    if dtype in STRING_TYPES:
+        # ".n" e' la lunghezza massima, non un bit; niente array di stringhe
+        count = bit if m.group(4) is not None else 254
+        if m.group(5) is not None or not (0 < count <= STRING_TYPES[dtype]):
+            raise ValueError(f"Unsupported address format: {address}")
+        bit = 0
+    parsed = (db, dtype, int(m.group(3)), bit, count, area)
+    _PARSED[address] = parsed
+    return parsed
+
+
+def preload_addresses(table: Dict[str, Tuple[int, str, int, int, int, int]]) -> None:
+    """Seed the :func:`parse_address` memo with an already validated table."""
+
+    _PARSED.update(table)
+
 
 class Utils:
 
     def _parse_address(self, address: str) -> tuple[int, str, int, int]:
-            """Parse an S7 DB address.
-
-            Returns a tuple of ``(db_number, data_type, byte_offset, bit_offset)``.
-            ``bit_offset`` is zero when not used.
+            """Parse an S7 address; see :func:`parse_address`.
 
-            Tipi supportati (e alias):
-            X   (bit)                       -> DBX
-            B   (byte)                      -> DBB
-            W/I (word/int16 signed)         -> DBW / DBI
-            D   (dword uint32)              -> DBD / D BW alias DW
-            R   (real float32)              -> DBR / DR
+            Returns ``(db_number, data_type, byte_offset, bit_offset)``.
             """
 
-            m = re.fullmatch(
-                r"DB(\d+)\.(?:DB)?(X|B|W|DW|D|I|DI|R|DR)(\d+)(?:\.(\d+))?",
-                address.upper()
-            )
-            if not m:
-                raise ValueError(f"Unsupported address format: {address}")
-
-            db = int(m.group(1))
-            dtype = m.group(2)
-            byte = int(m.group(3))
-            bit = int(m.group(4) or 0)
-
-            # Normalizza alias
-            if dtype in {"DW"}:
-                dtype = "D"
-            elif dtype in {"DI"}:
-                dtype = "I"
-            elif dtype in {"DR"}:
-                dtype = "R"
-
-            return db, dtype, byte, bit
+            return parse_address(address)[:4]
     
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from .read_plan import MAX_VARS
+from .utils import AREA_DB
+
+# Overhead in byte di una WriteVar S7: header + parametri + header dati per item
+_REQ_HEADER = 12
+_REQ_ITEM = 12 + 4
+
+
+@dataclass
+class PendingWrite:
+    """Contiguous bytes of a DB (or I/Q/M area) waiting to be written.
+
+    ``mask`` marks, bit by bit, which parts of ``data`` were set by a command.
+    Bytes whose mask is not ``0xFF`` need the current PLC value as base so the
+    untouched bits are preserved.
+    """
+
+    db: int
+    start: int
+    data: bytearray
+    mask: bytearray
+    area: int = AREA_DB
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.data)
+
+    @property
+    def partial(self) -> bool:
+        return any(m != 0xFF for m in self.mask)
+
+    def apply_base(self, base: bytes) -> None:
+        for i, m in enumerate(self.mask):
+            if m != 0xFF:
+                self.data[i] = (base[i] & ~m & 0xFF) | (self.data[i] & m)
+                self.mask[i] = 0xFF
+
+
+class WriteQueue:
+    """Pending PLC writes staged byte by byte.
+
+    Several bit writes to the same byte collapse into a single masked write
+    and a later write to the same bits overrides an earlier one, so a burst
+    of commands becomes one write per contiguous byte range.
+    """
+
+    def __init__(self):
+        # (area, db, byte) -> (valore, maschera dei bit impostati)
+        self._bytes: Dict[Tuple[int, int, int], Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._bytes)
+
+    def _stage(self, key: Tuple[int, int, int], value: int, mask: int) -> None:
+        old_value, old_mask = self._bytes.get(key, (0, 0))
+        self._bytes[key] = ((old_value & ~mask) | (value & mask), old_mask | mask)
+
+    def stage_bit(self, db: int, byte: int, bit: int, value: bool, area: int = AREA_DB) -> None:
+        if not (0 <= bit <= 7):
+            raise ValueError(f"bit fuori range (0..7): {bit}")
+        mask = 1 << bit
+        self._stage((area, db, byte), mask if value else 0, mask)
+
+    def stage_bytes(self, db: int, start: int, data: bytes, area: int = AREA_DB) -> None:
+        for i, b in enumerate(data):
+            self._stage((area, db, start + i), b, 0xFF)
+
+    def take(self) -> List[PendingWrite]:
+        """Return the staged bytes as contiguous ranges and clear the queue."""
+
+        writes: List[PendingWrite] = []
+        current = None
+        for (area, db, byte), (value, mask) in sorted(self._bytes.items()):
+            if current is None or current.area != area or current.db != db or current.end != byte:
+                current = PendingWrite(db, byte, bytearray(), bytearray(), area)
+                writes.append(current)
+            current.data.append(value)
+            current.mask.append(mask)
+        self._bytes.clear()
+        return writes
+
+
+def pack_multi_writes(writes: List[PendingWrite], pdu: int, max_vars: int = MAX_VARS) -> List[List[PendingWrite]]:
+    """Pack ranges into ``write_multi_vars`` batches fitting the PDU length.
+
+    Ranges larger than a single PDU are split first.
+    """
+
+    max_data = pdu - _REQ_HEADER - _REQ_ITEM
+    if max_data < 2:
+        raise ValueError(f"PDU troppo piccola: {pdu}")
+    max_data -= max_data & 1
+
+    chunks: List[PendingWrite] = []
+    for w in writes:
+        for offset in range(0, len(w.data), max_data):
+            chunks.append(
+                PendingWrite(
+                    w.db,
+                    w.start + offset,
+                    w.data[offset:offset + max_data],
+                    w.mask[offset:offset + max_data],
+                    w.area,
+                )
+            )
+
+    batches: List[List[PendingWrite]] = []
+    current: List[PendingWrite] = []
+    size = _REQ_HEADER
+    for chunk in chunks:
+        cost = _REQ_ITEM + len(chunk.data) + (len(chunk.data) & 1)
+        if current and (len(current) >= max_vars or size + cost > pdu):
+            batches.append(current)
+            current = []
+            size = _REQ_HEADER
+        current.append(chunk)
+        size += cost
+    if current:
+        batches.append(current)
+    return batches